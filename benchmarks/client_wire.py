@@ -0,0 +1,64 @@
+"""
+Measure connection reuse and bytes on the wire against the stub server
+
+    uv run -- python -m benchmarks.client_wire
+"""
+
+from datetime import datetime
+
+import requests
+
+from benchmarks.stub_server import StubLogiwaServer
+from logiwa.cache import DiskCache
+from logiwa.api import (
+    LogiwaClient,
+    SEARCH_PATH,
+    SEARCH_WINDOW,
+    SearchWindow,
+    build_search_params,
+)
+from logiwa.ratelimit import RateLimiter
+
+WAREHOUSES = {1: 5, 2: 5}
+WINDOW = SearchWindow(datetime.now() - SEARCH_WINDOW, datetime.now() + SEARCH_WINDOW)
+
+
+def unpooled(server: StubLogiwaServer) -> None:
+    """The old behaviour: module-level requests.post, no compression"""
+    for warehouse, pages in WAREHOUSES.items():
+        for page_index in range(1, pages + 1):
+            requests.post(
+                f"{server.base_url}{SEARCH_PATH}",
+                json=build_search_params(warehouse, page_index, WINDOW),
+                headers={"Accept-Encoding": "identity"},
+            ).json()
+
+
+def pooled(server: StubLogiwaServer) -> None:
+    limiter = RateLimiter(requests_per_minute=60_000, burst=100)
+    # in-memory cache, so every run requests its token
+    cache = DiskCache(path="")
+    with LogiwaClient(base_url=server.base_url, limiter=limiter, cache=cache) as client:
+        client.authenticate()
+        for warehouse, pages in WAREHOUSES.items():
+            for page_index in range(1, pages + 1):
+                client.post(
+                    SEARCH_PATH,
+                    json=build_search_params(warehouse, page_index, WINDOW),
+                    headers=client.auth_headers(),
+                ).json()
+
+
+def main() -> None:
+    with StubLogiwaServer(WAREHOUSES) as server:
+        for name, run in (("unpooled", unpooled), ("pooled", pooled)):
+            server.reset_counters()
+            run(server)
+            print(
+                f"{name:>9}: {server.requests} requests over "
+                f"{server.connections} connections, {server.bytes_sent:,} bytes"
+            )
+
+
+if __name__ == "__main__":
+    main()
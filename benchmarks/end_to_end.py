@@ -0,0 +1,192 @@
+"""
+End-to-end throughput against the stub server and a local SQLite database
+
+Runs main.main() - authenticate, fetch, stage, parse and load - against a
+StubLogiwaServer serving synthetic orders, and reports orders/sec, the
+per-phase times recorded in ShipmentOrder_RunMetrics and peak memory. The
+server runs in its own process so neither its CPU nor its memory is counted.
+Tables are cleared between rounds so every round does the full load.
+
+    uv run -- python -m benchmarks.end_to_end --latency 0.2 --throttle-every 20
+    uv run -- python -m benchmarks.end_to_end --save baseline.json
+    uv run -- python -m benchmarks.end_to_end --baseline baseline.json
+
+Settings such as RUN_MODE, LOAD_MODE, LOGIWA_FETCH_MODE, PARSE_WORKERS or
+STAGING_COMPRESSION are read from the environment as usual.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+
+def _serve(settings: Dict[str, Any], pipe) -> None:
+    """Run a StubLogiwaServer until told to stop; runs in a child process"""
+    from benchmarks.stub_server import StubLogiwaServer
+
+    warehouses = {w: settings["pages"] for w in range(1, settings["warehouses"] + 1)}
+    with StubLogiwaServer(
+        warehouses,
+        page_size=settings["page_size"],
+        latency=settings["latency"],
+        order_latency=settings["order_latency"],
+        throttle_every=settings["throttle_every"],
+        synthetic=True,
+    ) as server:
+        server.warm()
+        pipe.send(server.base_url)
+        pipe.recv()
+        pipe.send({"requests": server.requests, "throttled": server.throttled})
+
+
+def _reset(conn) -> None:
+    """
+    Empty the tables a run writes, keeping earlier runs' records; tuned page
+    sizes are cleared too, so every round starts from the same PageSize
+    """
+    from models.backends import backend_for
+    from models.database import PARSED_TABLES
+
+    backend = backend_for(conn)
+    tables = [table for _, table, _, _, _ in PARSED_TABLES]
+    tables = [*reversed(tables), "ShipmentOrder_Staging", "ShipmentOrder_SyncState"]
+    for table in [*tables, "ShipmentOrder_PageSize"]:
+        conn.execute(backend.truncate_sql(table))
+    conn.commit()
+
+
+def _run_metrics(conn) -> Dict[str, float]:
+    """Metrics of the latest run, as saved by models.database.insert_run"""
+    return dict(
+        conn.execute(
+            "SELECT metric, value FROM ShipmentOrder_RunMetrics "
+            "WHERE run_id = (SELECT MAX(id) FROM ShipmentOrder_Runs)"
+        ).fetchall()
+    )
+
+
+def benchmark(settings: Dict[str, Any], rounds: int) -> List[Dict[str, float]]:
+    """Run main.main() `rounds` times against a fresh server and database"""
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe()
+    server = context.Process(target=_serve, args=(settings, child), daemon=True)
+    server.start()
+    base_url = parent.recv()
+
+    workdir = tempfile.mkdtemp(prefix="logiwa-bench-")
+    os.environ.update(
+        DB_BACKEND="sqlite3",
+        SQLITE_PATH=os.path.join(workdir, "bench.db"),
+        LOGIWA_BASE_URL=base_url,
+        LOGIWA_CACHE_PATH=os.path.join(workdir, "cache.json"),
+        LOGIWA_FULL_SYNC="1",
+        LOGIWA_MAX_REQUESTS_PER_MINUTE=os.getenv("LOGIWA_MAX_REQUESTS_PER_MINUTE", "600000"),
+        LOGIWA_RATE_LIMIT_BURST=os.getenv("LOGIWA_RATE_LIMIT_BURST", "100"),
+    )
+    # configuration is read at import, so import only once the environment is set
+    import main
+    from models.backends import connect
+    from models.metrics import peak_rss_mb
+
+    results = []
+    try:
+        for _ in range(rounds):
+            conn = connect()
+            _reset(conn)
+            started = time.perf_counter()
+            status = main.main()
+            seconds = time.perf_counter() - started
+            metrics = _run_metrics(conn)
+            fetched = conn.execute(
+                "SELECT orders_fetched FROM ShipmentOrder_Runs ORDER BY id DESC"
+            ).fetchone()[0]
+            conn.close()
+            if status != 0:
+                raise RuntimeError(f"main() returned {status}")
+
+            result = {
+                "seconds": seconds,
+                "orders_per_sec": fetched / seconds,
+                "peak_rss_mb": peak_rss_mb(),
+                # reported by the workers themselves, 0 when parsing in-process
+                "peak_rss_children_mb": metrics.get("parse_worker_peak_rss_mb", 0.0),
+            }
+            result.update(
+                (metric, value)
+                for metric, value in metrics.items()
+                if metric.startswith(("phase_seconds.", "api_"))
+            )
+            results.append(result)
+    finally:
+        parent.send("stop")
+        counts = parent.recv()
+        server.join()
+    print(f"server: {counts['requests']} requests, {counts['throttled']} throttled")
+    return results
+
+
+def _median(results: List[Dict[str, float]]) -> Dict[str, float]:
+    keys = sorted({key for result in results for key in result})
+    return {
+        key: statistics.median(result.get(key, 0.0) for result in results)
+        for key in keys
+    }
+
+
+def report(current: Dict[str, float], baseline: Optional[Dict[str, float]] = None) -> None:
+    for key, value in current.items():
+        line = f"{key:>32}: {value:12,.3f}"
+        if baseline and baseline.get(key):
+            line += f"   baseline {baseline[key]:12,.3f} ({value / baseline[key] - 1:+.1%})"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--warehouses", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=10, help="pages per warehouse")
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per search response")
+    parser.add_argument(
+        "--order-latency", type=float, default=0.0, help="extra seconds per order in a response"
+    )
+    parser.add_argument("--throttle-every", type=int, default=0, help="403 every Nth search")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--save", help="write the median results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    args = parser.parse_args()
+
+    settings = {
+        "warehouses": args.warehouses,
+        "pages": args.pages,
+        "page_size": args.page_size,
+        "latency": args.latency,
+        "order_latency": args.order_latency,
+        "throttle_every": args.throttle_every,
+    }
+    orders = args.warehouses * args.pages * args.page_size
+    print(f"{orders} orders per round, {args.rounds} rounds, {settings}")
+
+    current = _median(benchmark(settings, args.rounds))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as source:
+            saved = json.load(source)
+        if saved["settings"] != settings:
+            print(f"warning: baseline was run with {saved['settings']}")
+        baseline = saved["results"]
+    report(current, baseline)
+
+    if args.save:
+        with open(args.save, "w") as out:
+            json.dump({"settings": settings, "results": current}, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
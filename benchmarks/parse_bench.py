@@ -0,0 +1,84 @@
+"""
+Orders/sec for the order and line field mapping on a synthetic 200-order page
+
+"interpreted" walks the field spec calling WarehouseOrderParser.parse_<kind>
+per field, which is what the hand-written parse_order did; "compiled" is the
+converter generated by models.fieldspec that the parser now uses.
+
+    uv run -- python -m benchmarks.parse_bench
+"""
+
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from benchmarks.synthetic import synthetic_page
+from models.dates import FORMAT_HITS, cache_info
+from models.datastructs import ShipmentOrder, ShipmentOrderLine
+from models.fieldspec import ORDER_FIELDS, LINE_FIELDS
+from models.parsing import WarehouseOrderParser, content_hash
+
+ROUNDS = 10
+
+_parser = WarehouseOrderParser()
+
+
+def interpreted(data: Dict[str, Any]) -> None:
+    order = {
+        spec.column: getattr(_parser, f"parse_{spec.kind}")(data.get(spec.api_key))
+        for spec in ORDER_FIELDS
+    }
+    ShipmentOrder(
+        id=data["ID"],
+        code=data["Code"],
+        api_fetch_timestamp=datetime.now(),
+        content_hash=content_hash(data),
+        created_at=datetime.now(),
+        updated_at=datetime.now(),
+        **order,
+    )
+    for detail in data.get("DetailInfo") or []:
+        line = {
+            spec.column: getattr(_parser, f"parse_{spec.kind}")(
+                detail.get(spec.api_key)
+            )
+            for spec in LINE_FIELDS
+        }
+        ShipmentOrderLine(
+            id=detail["ID"],
+            code=detail["Code"],
+            warehouse_order_id=data["ID"],
+            created_at=datetime.now(),
+            updated_at=datetime.now(),
+            **line,
+        )
+
+
+def compiled(data: Dict[str, Any]) -> None:
+    _parser.parse_order(data)
+    _parser.parse_order_lines(data)
+
+
+def measure(convert: Callable, page: List[Dict[str, Any]]) -> float:
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        for order in page:
+            convert(order)
+    return ROUNDS * len(page) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    page = synthetic_page(warehouse=1, page_index=1)
+    lines = sum(len(order["DetailInfo"]) for order in page)
+    print(f"{len(page)} orders, {lines} lines, {ROUNDS} rounds")
+
+    before = measure(interpreted, page)
+    after = measure(compiled, page)
+    print(f"interpreted: {before:10,.0f} orders/sec")
+    print(f"   compiled: {after:10,.0f} orders/sec ({after / before:.2f}x)")
+    print(f"date formats: {dict(FORMAT_HITS)}")
+    print(f"date cache: {cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Local stand-in for the Logiwa API, for offline runs and benchmarks
+"""
+
+import gzip
+import json
+import math
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Set, Tuple
+
+from benchmarks.synthetic import synthetic_order
+
+# OrderDate as sent by WarehouseOrderSearch and in its query bounds
+DATE_FORMAT = "%m.%d.%Y %H:%M:%S"
+
+
+def stub_order(order_id: int, warehouse: int, lines: int = 5) -> Dict[str, Any]:
+    """A WarehouseOrderSearch order with enough detail to be representative"""
+    return {
+        "ID": order_id,
+        "Code": f"WO-{order_id}",
+        "WarehouseID": warehouse,
+        "WarehouseCode": f"WH{warehouse}",
+        "CustomerID": 1000 + order_id % 50,
+        "CustomerDescription": "Stub Customer",
+        "OrderDate": "03.17.2022 12:32:59",
+        "LastModifiedDate": "03.18.2022 09:15:00",
+        "Notes": "Leave at the front desk",
+        # the API repeats the page's pagination on every order
+        "PageSize": 200,
+        "SelectedPageIndex": 1,
+        "PageCount": 1,
+        "RecordCount": 200,
+        "ChannelID": [1],
+        "CarrierID": [2],
+        "OrderCustomStatusID": [],
+        "WarehouseOrderStatusID": [3],
+        "WarehouseFBAOrderStatusID": [],
+        "DetailInfo": [
+            {
+                "ID": order_id * 100 + line,
+                "Code": f"WO-{order_id}-{line}",
+                "InventoryItemID": 500 + line,
+                "InventoryItemDescription": f"Stub Item {line}",
+                "Barcode": f"0000{500 + line}",
+                "PackQuantity": 1,
+                "PlannedCuQuantity": 2,
+                "SalesUnitPrice": 9.99,
+            }
+            for line in range(lines)
+        ],
+    }
+
+
+class StubLogiwaServer:
+    """
+    Threaded HTTP server that answers like hubapi.logiwa.com
+
+    `warehouses` maps a warehouse ID to the number of pages of `page_size`
+    orders it serves; a search's own PageSize is honoured. Its orders are
+    dated evenly over `days` days centered on when the server was created,
+    and a search returns those within its OrderDate bounds. Search
+    responses are delayed by `latency` seconds plus `order_latency` per
+    order, and every `throttle_every`-th search is refused with a 403
+    carrying a Retry-After of `retry_after` seconds. `synthetic` serves
+    benchmarks.synthetic orders instead of the uniform stub orders; encoded
+    pages are cached, so the server's own cost stays small next to the
+    client's.
+    """
+
+    def __init__(
+        self,
+        warehouses: Dict[int, int],
+        page_size: int = 200,
+        latency: float = 0.0,
+        order_latency: float = 0.0,
+        throttle_every: int = 0,
+        retry_after: float = 0.05,
+        synthetic: bool = False,
+        days: int = 80,
+    ):
+        self.warehouses = warehouses
+        self.page_size = page_size
+        self.latency = latency
+        self.order_latency = order_latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.synthetic = synthetic
+        self.span = timedelta(days=days)
+        self.begin = datetime.now().replace(microsecond=0) - self.span / 2
+        self.connections = 0
+        self.requests = 0
+        self.throttled = 0
+        self.bytes_sent = 0
+        self.searches = 0
+        self.tokens_issued = 0
+        self.revoked: Set[str] = set()
+        self.pages: Dict[Tuple[int, int, int, int, int, Optional[str]], bytes] = {}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def __enter__(self) -> "StubLogiwaServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_counters(self) -> None:
+        with self.lock:
+            self.connections = 0
+            self.requests = 0
+            self.throttled = 0
+            self.bytes_sent = 0
+            self.searches = 0
+
+    def revoke_tokens(self) -> None:
+        """Expire every token issued so far; requests using one get a 401"""
+        with self.lock:
+            self.revoked.update(f"stub-token-{n}" for n in range(1, self.tokens_issued + 1))
+
+    def authorized(self, authorization: Optional[str]) -> bool:
+        token = (authorization or "").removeprefix("Bearer ")
+        with self.lock:
+            return token not in self.revoked
+
+    def throttle(self, path: str) -> bool:
+        """Whether this request should be refused with a 403"""
+        if not path.endswith("/WarehouseOrderSearch") or not self.throttle_every:
+            return False
+        with self.lock:
+            self.searches += 1
+            return self.searches % self.throttle_every == 0
+
+    def delay(self, body: bytes) -> None:
+        """Wait as long as building the requested page takes the real API"""
+        seconds = self.latency
+        if self.order_latency:
+            start, stop = self.page(json.loads(body or b"{}"))
+            seconds += self.order_latency * (stop - start)
+        if seconds:
+            time.sleep(seconds)
+
+    def order_range(self, params: Dict[str, Any]) -> Tuple[int, int]:
+        """Indexes [first, last) of the warehouse's orders within the OrderDate bounds"""
+        total = self.warehouses.get(params.get("WarehouseID"), 0) * self.page_size
+        first, last = 0, total
+        if total:
+            # order i is dated at the middle of the i-th of `total` equal slices
+            step = self.span / total
+            if params.get("OrderDate_Start"):
+                start = datetime.strptime(params["OrderDate_Start"], DATE_FORMAT)
+                first = max(0, math.ceil((start - self.begin) / step - 0.5))
+            if params.get("OrderDate_End"):
+                end = datetime.strptime(params["OrderDate_End"], DATE_FORMAT)
+                last = min(total, math.floor((end - self.begin) / step - 0.5) + 1)
+        return first, max(first, last)
+
+    def order(self, warehouse: int, index: int) -> Dict[str, Any]:
+        """The warehouse's `index`-th order by OrderDate"""
+        order_id = warehouse * 1_000_000 + index
+        if self.synthetic:
+            order = synthetic_order(order_id, warehouse)
+        else:
+            order = stub_order(order_id, warehouse)
+        total = self.warehouses[warehouse] * self.page_size
+        order_date = self.begin + self.span * (index + 0.5) / total
+        order["OrderDate"] = order_date.strftime(DATE_FORMAT)
+        return order
+
+    def page(self, params: Dict[str, Any]) -> Tuple[int, int]:
+        """Indexes [start, stop) of the orders on the requested page"""
+        first, last = self.order_range(params)
+        page_size = params.get("PageSize") or self.page_size
+        start = first + (params.get("SelectedPageIndex", 1) - 1) * page_size
+        return start, max(start, min(last, start + page_size))
+
+    def search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        warehouse = params.get("WarehouseID")
+        first, last = self.order_range(params)
+        start, stop = self.page(params)
+        page_size = params.get("PageSize") or self.page_size
+        pagination = {
+            "PageSize": page_size,
+            "SelectedPageIndex": params.get("SelectedPageIndex", 1),
+            "PageCount": math.ceil((last - first) / page_size),
+            "RecordCount": last - first,
+        }
+        data = [self.order(warehouse, i) for i in range(start, stop)]
+        for order in data:
+            order.update(pagination)
+        return {"Data": data, **pagination}
+
+    def respond(self, path: str, body: bytes) -> Dict[str, Any]:
+        if path == "/token":
+            with self.lock:
+                self.tokens_issued += 1
+                token = f"stub-token-{self.tokens_issued}"
+            return {"access_token": token, "expires_in": 86400}
+        if path.endswith("/LookUp"):
+            return {
+                "Lookup": {"WarehouseList": [{"Id": w} for w in self.warehouses]}
+            }
+        if path.endswith("/WarehouseOrderSearch"):
+            return self.search(json.loads(body or b"{}"))
+        return {}
+
+    def encoded(self, path: str, body: bytes, encoding: Optional[str]) -> bytes:
+        """The response body for a request, compressed; search pages are cached"""
+        key = None
+        if path.endswith("/WarehouseOrderSearch"):
+            params = json.loads(body or b"{}")
+            first, last = self.order_range(params)
+            page_size = params.get("PageSize") or self.page_size
+            start, _ = self.page(params)
+            key = (params.get("WarehouseID"), first, last, page_size, start, encoding)
+            with self.lock:
+                cached = self.pages.get(key)
+            if cached is not None:
+                return cached
+
+        payload = json.dumps(self.respond(path, body)).encode()
+        if encoding == "gzip":
+            payload = gzip.compress(payload)
+        elif encoding == "deflate":
+            payload = zlib.compress(payload)
+
+        if key is not None:
+            with self.lock:
+                self.pages[key] = payload
+        return payload
+
+    def warm(self, encoding: Optional[str] = "gzip") -> None:
+        """
+        Encode every page of the whole date range up front, so no request
+        for it pays for building one; narrower queries are built on demand
+        """
+        for warehouse, page_count in self.warehouses.items():
+            for page_index in range(1, page_count + 1):
+                params = {"WarehouseID": warehouse, "SelectedPageIndex": page_index}
+                self.encoded(
+                    "/WarehouseOrderSearch", json.dumps(params).encode(), encoding
+                )
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connections += 1
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not server.authorized(self.headers.get("Authorization")):
+                    self.refuse(401, b'{"Message": "Authorization has been denied"}')
+                    return
+                if server.throttle(self.path):
+                    self.refuse(403, b'{"Message": "Too many requests"}')
+                    return
+                if self.path.endswith("/WarehouseOrderSearch"):
+                    server.delay(body)
+
+                encoding = None
+                accepted = self.headers.get("Accept-Encoding", "")
+                if "gzip" in accepted:
+                    encoding = "gzip"
+                elif "deflate" in accepted:
+                    encoding = "deflate"
+                payload = server.encoded(self.path, body, encoding)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if encoding:
+                    self.send_header("Content-Encoding", encoding)
+                self.end_headers()
+                # count before replying, so a client never sees a response
+                # its request is not counted in yet
+                with server.lock:
+                    server.requests += 1
+                    server.bytes_sent += len(payload)
+                self.wfile.write(payload)
+
+            def refuse(self, status: int, payload: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if status == 403:
+                    self.send_header("Retry-After", str(server.retry_after))
+                self.end_headers()
+                with server.lock:
+                    server.requests += 1
+                    server.throttled += status == 403
+                    server.bytes_sent += len(payload)
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
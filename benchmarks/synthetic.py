@@ -0,0 +1,105 @@
+"""
+Synthetic WarehouseOrderSearch orders
+
+Orders carry every field WarehouseOrderParser reads, with values of the kind
+the API sends (including the odd empty string, "null" and missing key), so
+parsing and loading benchmarks see realistic work.
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from models.fieldspec import FieldSpec, ORDER_FIELDS, LINE_FIELDS
+
+_WORDS = [
+    "pallet", "carton", "express", "ground", "fragile", "priority", "amazon",
+    "shopify", "returns", "east", "west", "dock", "bulk", "sample", "retail",
+]
+_EPOCH = datetime(2024, 1, 1)
+
+
+def _date(rng: random.Random) -> str:
+    """A date in one of the formats the API has been seen to send"""
+    moment = _EPOCH + timedelta(seconds=rng.randrange(0, 3 * 365 * 86400))
+    if rng.random() < 0.8:
+        return moment.strftime("%m.%d.%Y %I:%M:%S")
+    return f"{moment.month}/{moment.day}/{moment.year} {moment.strftime('%-I:%M:%S %p')}"
+
+
+def _value(spec: FieldSpec, rng: random.Random) -> Any:
+    roll = rng.random()
+    if roll < 0.25:
+        return None
+    if roll < 0.28:
+        return "" if spec.kind != "datetime" else "null"
+    if spec.kind == "str":
+        return " ".join(rng.choices(_WORDS, k=rng.randint(1, 4))).title()
+    if spec.kind == "int":
+        return rng.randint(1, 100_000)
+    if spec.kind == "bool":
+        return rng.random() < 0.5
+    if spec.kind == "decimal":
+        return round(rng.uniform(0, 500), 2)
+    return _date(rng)
+
+
+def _fill(specs: List[FieldSpec], rng: random.Random) -> Dict[str, Any]:
+    out = {}
+    for spec in specs:
+        if rng.random() < 0.05:
+            continue  # key missing from the payload entirely
+        out[spec.api_key] = _value(spec, rng)
+    return out
+
+
+def synthetic_order(
+    order_id: int,
+    warehouse: int,
+    rng: Optional[random.Random] = None,
+    max_lines: int = 8,
+) -> Dict[str, Any]:
+    """One order as returned in WarehouseOrderSearch's Data array"""
+    rng = rng or random.Random(order_id)
+    order = _fill(ORDER_FIELDS, rng)
+    order.update(
+        {
+            "ID": order_id,
+            "Code": f"WO-{order_id}",
+            "WarehouseID": warehouse,
+            "ChannelID": rng.sample(range(1, 20), rng.randint(0, 2)),
+            "CarrierID": rng.sample(range(1, 20), rng.randint(0, 2)),
+            "OrderCustomStatusID": rng.sample(range(1, 20), rng.randint(0, 1)),
+            "WarehouseOrderStatusID": rng.sample(range(1, 20), rng.randint(0, 2)),
+            "WarehouseFBAOrderStatusID": rng.sample(range(1, 20), rng.randint(0, 1)),
+        }
+    )
+
+    lines = []
+    for line in range(rng.randint(1, max_lines)):
+        detail = _fill(LINE_FIELDS, rng)
+        detail.update({"ID": order_id * 100 + line, "Code": f"WO-{order_id}-{line}"})
+        lines.append(detail)
+    order["DetailInfo"] = lines
+
+    if rng.random() < 0.3:
+        order["ThirdPartyAccount"] = {
+            "AccountNumber": str(rng.randint(10**6, 10**7)),
+            "Address": {
+                "Country": "US",
+                "State": rng.choice(["NY", "CA", "TX", "WA"]),
+                "City": rng.choice(_WORDS).title(),
+                "AddressText": f"{rng.randint(1, 9999)} {rng.choice(_WORDS).title()} St",
+                "PostalCode": f"{rng.randint(10000, 99999)}",
+            },
+        }
+    return order
+
+
+def synthetic_page(
+    warehouse: int, page_index: int, page_size: int = 200, seed: int = 0
+) -> List[Dict[str, Any]]:
+    """A full page of orders; the same arguments always give the same page"""
+    rng = random.Random(hash((seed, warehouse, page_index)))
+    first = warehouse * 1_000_000 + (page_index - 1) * page_size
+    return [synthetic_order(first + i, warehouse, rng) for i in range(page_size)]
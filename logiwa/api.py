@@ -1,207 +1,764 @@
+import math
 import os
-from typing import Optional, List, Dict, Any
+import threading
+from collections import defaultdict
+from typing import Optional, List, Dict, Any, Callable, NamedTuple, Set, Tuple
 from datetime import datetime, timedelta
-import json
-from logging import debug, error
+from logging import debug, error, info
 import requests
+from requests.adapters import HTTPAdapter
 import time
 
-from pymssql import Connection
-# from sqlite3 import Connection
+import aiohttp
+
+from models.backends import Connection
+from models.database import (
+    clear_checkpoints,
+    last_fetched_date,
+    insert_staging_orders,
+    load_checkpoints,
+    load_page_sizes,
+    load_sync_state,
+    save_checkpoints,
+    save_page_sizes,
+    save_sync_state,
+    update_checkpoint,
+)
+from models.dates import parse_datetime
+from models.jsoncodec import split_search_response
+from models.datastructs import FetchCheckpoint, ShipmentOrderRun
+from logiwa.cache import DiskCache
+from models.pool import ConnectionPool
+from logiwa.pagesize import PAGE_SIZE, TARGET_SECONDS, PageSizeTuner
+from logiwa.ratelimit import RateLimiter, RETRYABLE_STATUS, retry_delay
 
-from models.database import last_fetched_date
 
+# Global rate limit configuration
+MAX_REQUESTS_PER_MINUTE = int(os.getenv("LOGIWA_MAX_REQUESTS_PER_MINUTE", "60"))
+RATE_LIMIT_BURST = int(os.getenv("LOGIWA_RATE_LIMIT_BURST", "1"))
+# Retries for throttled (403/429) or failed (5xx) requests before giving up
+MAX_RETRIES = int(os.getenv("LOGIWA_MAX_RETRIES", "5"))
+
+# Shared by the sync and async fetch paths
+LIMITER = RateLimiter(MAX_REQUESTS_PER_MINUTE, RATE_LIMIT_BURST)
+
+# Point at a local stub server for offline runs
+BASE_URL = os.getenv("LOGIWA_BASE_URL", "https://hubapi.logiwa.com")
+# Keep-alive connections held open per client
+POOL_SIZE = int(os.getenv("LOGIWA_POOL_SIZE", "10"))
+# A request is given up on after waiting this long for the connection, or for
+# its response to start (or continue) arriving; a search page that times out
+# halves its warehouse's PageSize
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = float(os.getenv("LOGIWA_READ_TIMEOUT_SECONDS", str(3 * TARGET_SECONDS)))
+
+TOKEN_PATH = "/token"
+LOOKUP_PATH = "/en/api/IntegrationApi/LookUp"
+SEARCH_PATH = "/en/api/IntegrationApi/WarehouseOrderSearch"
+SEARCH_WINDOW = timedelta(days=45)
+
+# LookUp results (e.g. the warehouse list) are reused across runs for this long
+LOOKUP_TTL = int(os.getenv("LOGIWA_LOOKUP_TTL_SECONDS", "3600"))
+# A cached token is dropped this long before the API says it expires
+TOKEN_EXPIRY_MARGIN = 300
+# Token lifetime assumed when the token response has no expires_in
+DEFAULT_TOKEN_TTL = 3600
+
+# Each warehouse is queried from its high-water mark minus this overlap, so
+# orders modified while the previous run was paging are not missed
+SYNC_OVERLAP = timedelta(minutes=int(os.getenv("LOGIWA_SYNC_OVERLAP_MINUTES", "10")))
+# Ignore high-water marks and sweep the whole OrderDate window
+FULL_SYNC = os.getenv("LOGIWA_FULL_SYNC", "0") == "1"
+# Continue an unfinished fetch from its checkpoints; "0" discards them
+RESUME = os.getenv("LOGIWA_RESUME", "1") == "1"
+# A warehouse's OrderDate window is split into sub-windows (shards) of about
+# this many pages by RecordCount; 0 pages through each window whole
+SHARD_PAGES = int(os.getenv("LOGIWA_SHARD_PAGES", "10"))
+# Shards are not split narrower than this
+MIN_SHARD_WINDOW = timedelta(minutes=1)
+
+# Writes a page of orders (and their JSON text, when known) to staging and
+# returns how many were skipped as unchanged; insert_staging_orders unless a
+# caller also consumes the pages
+StageOrders = Callable[[Connection, List[Dict[str, Any]], Optional[List[str]]], int]
+
+# A page's orders and, when available, each order's JSON text as received
+Page = Tuple[List[Dict[str, Any]], Optional[List[str]]]
+
+# (warehouse, shard number) of one sub-window of a warehouse's fetch
+ShardKey = Tuple[int, int]
+
+
+def _accept_encoding() -> str:
+    """Advertise brotli only when a decoder is installed"""
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return "gzip, deflate"
+    return "gzip, deflate, br"
+
+
+ACCEPT_ENCODING = _accept_encoding()
+
+
+class LogiwaClient:
+    """
+    Client for the Logiwa WMS API
 
-API_TOKEN: Optional[str] = None
+    Owns the bearer token and a pooled keep-alive session, so every request
+    after the first reuses an open connection. Responses are requested
+    compressed and decoded transparently. The token and LookUp results are
+    kept in an on-disk cache across runs; a token the API rejects with a 401
+    is replaced and the request sent again.
+    """
 
-# Global rate limit configuration
-MAX_REQUESTS_PER_MINUTE = 60  # Adjust this as needed
+    def __init__(
+        self,
+        base_url: str = BASE_URL,
+        limiter: RateLimiter = LIMITER,
+        pool_size: int = POOL_SIZE,
+        cache: Optional[DiskCache] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.limiter = limiter
+        self.pool_size = pool_size
+        self.cache = cache if cache is not None else DiskCache()
+        # cache entries are per API host and account
+        self.cache_prefix = f"{self.base_url}|{os.getenv('LOGIWA_USERNAME')}"
+        self.token: Optional[str] = None
+        self.token_lock = threading.Lock()
+        self.bytes_received = 0
+        self.request_seconds: List[float] = []
+        self.retries = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "Accept": "application/json",
+                "Accept-Encoding": ACCEPT_ENCODING,
+            }
+        )
 
+    def __enter__(self) -> "LogiwaClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def auth_headers(self) -> Dict[str, str]:
+        """Headers for authenticated JSON requests"""
+        return {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+        }
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        """
+        Send a rate-limited POST over the pooled session
+
+        An authenticated request rejected with a 401 is sent once more with
+        a fresh token.
+        """
+        response = self._send(path, **kwargs)
+        headers = kwargs.get("headers") or {}
+        if response.status_code == 401 and "Authorization" in headers:
+            rejected = headers["Authorization"].removeprefix("Bearer ")
+            if self.refresh_token(rejected):
+                kwargs["headers"] = {**headers, **self.auth_headers()}
+                response = self._send(path, **kwargs)
+        return response
+
+    def _send(self, path: str, **kwargs) -> requests.Response:
+        self.limiter.acquire()
+        started = time.monotonic()
+        kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+        response = self.session.post(self.url(path), **kwargs)
+        self.record_request(time.monotonic() - started)
+        self.record_bytes(response.headers.get("Content-Length"), response.content)
+        return response
+
+    def record_request(self, seconds: float) -> None:
+        """Log one request's latency, sent through either fetch path"""
+        self.request_seconds.append(seconds)
+        self.limiter.record_transfer(seconds)
+
+    def record_retry(self, delay: float) -> None:
+        """Count a retry by this client; the shared limiter keeps process totals"""
+        self.retries += 1
+        self.limiter.record_backoff(delay)
+
+    def record_bytes(self, content_length: Optional[str], body: bytes) -> None:
+        """Count bytes as sent on the wire (compressed) where the server says"""
+        try:
+            self.bytes_received += int(content_length)
+        except (TypeError, ValueError):
+            self.bytes_received += len(body)
+
+    def async_session(self, limit: int) -> aiohttp.ClientSession:
+        """aiohttp session sharing this client's headers, timeouts and a keep-alive pool"""
+        connector = aiohttp.TCPConnector(limit=limit, keepalive_timeout=30)
+        # no overall limit: a large page may take a while as long as it keeps arriving
+        timeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={
+                "Accept": "application/json",
+                "Accept-Encoding": ACCEPT_ENCODING,
+            },
+        )
 
-def get_api_token() -> bool:
-    """
-    Retrieves an API token for the Logiwa WMS API
+    def authenticate(self) -> bool:
+        """
+        Retrieves an API token for the Logiwa WMS API, reusing a cached one until it expires
+        """
+        token = self.cache.get(f"{self.cache_prefix}|token")
+        if token:
+            self.token = token
+            debug("using cached API token")
+            return True
+        return self._request_token()
+
+    def _request_token(self) -> bool:
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        body = f"grant_type=password&username={os.getenv('LOGIWA_USERNAME')}&password={os.getenv('LOGIWA_PASSWORD')}"
+        res = self._send(TOKEN_PATH, data=body, headers=headers)
+
+        res_body = res.json()
+        if res_body.get("access_token"):
+            self.token = str(res_body["access_token"])
+            try:
+                lifetime = int(res_body.get("expires_in", DEFAULT_TOKEN_TTL))
+            except (TypeError, ValueError):
+                lifetime = DEFAULT_TOKEN_TTL
+            if lifetime > TOKEN_EXPIRY_MARGIN:
+                self.cache.set(
+                    f"{self.cache_prefix}|token", self.token, lifetime - TOKEN_EXPIRY_MARGIN
+                )
+            return True
+        else:
+            error(res_body.get(".error"))
+            return False
+
+    def refresh_token(self, rejected: Optional[str]) -> bool:
+        """
+        Replace a token the API rejected
+
+        Safe to call from several threads at once: only the first caller for
+        a given rejected token requests a new one.
+        """
+        with self.token_lock:
+            if self.token != rejected:
+                return self.token is not None
+            info("API token rejected, requesting a new one")
+            self.cache.delete(f"{self.cache_prefix}|token")
+            return self._request_token()
+
+    def lookup(self, *lookup_lists: int) -> Optional[Dict[str, Any]]:
+        """The LookUp object for the given lists, cached for LOOKUP_TTL"""
+        key = f"{self.cache_prefix}|lookup|{','.join(map(str, sorted(lookup_lists)))}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        params = {"LookupList": list(lookup_lists)}
+        res = self.post(LOOKUP_PATH, json=params, headers=self.auth_headers())
+        response_data = res.json()
+        if res.status_code != 200:
+            error(response_data)
+            return None
+        lookup = response_data["Lookup"]
+        self.cache.set(key, lookup, LOOKUP_TTL)
+        return lookup
+
+    def get_warehouses(self) -> Optional[List[int]]:
+        lookup = self.lookup(2)  # get warehouse IDs only
+        if lookup is None:
+            return None
+        return [warehouse["Id"] for warehouse in lookup.get("WarehouseList")]
+
+    def summary(self) -> str:
+        return f"{self.limiter.summary()}, {self.bytes_received} bytes received"
+
+    def record_metrics(self, run: ShipmentOrderRun) -> None:
+        """Copy request latencies, retries and bytes into the run's metrics"""
+        run.metrics.record_api(self.request_seconds, self.retries, self.bytes_received)
+
+
+class SearchWindow(NamedTuple):
+    """WarehouseOrderSearch date bounds for one warehouse, fixed for a run"""
+
+    order_date_start: datetime
+    order_date_end: datetime
+    last_modified_start: Optional[datetime] = None
+
+
+def search_windows(
+    conn: Connection,
+    warehouses: List[int],
+    run_start: datetime,
+    full_sync: bool = FULL_SYNC,
+) -> Dict[int, SearchWindow]:
     """
-    global API_TOKEN
+    Query bounds per warehouse, computed once when a run starts
 
-    url = "https://hubapi.logiwa.com/token"
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Accept": "application/json",
-    }
+    The OrderDate window is centered on `run_start` rather than the clock at
+    each request, so pages do not shift under a run that is paging. Each
+    warehouse is queried from its high-water mark minus SYNC_OVERLAP;
+    warehouses without one fall back to the last successful run. A full sync
+    ignores both and sweeps the whole window.
+    """
+    marks = {} if full_sync else load_sync_state(conn)
+    fallback = None if full_sync else last_fetched_date(conn)
 
-    body = f"grant_type=password&username={os.getenv('LOGIWA_USERNAME')}&password={os.getenv('LOGIWA_PASSWORD')}"
-    res = requests.post(url, data=body, headers=headers)
+    windows = {}
+    for warehouse in warehouses:
+        mark = marks.get(warehouse)
+        windows[warehouse] = SearchWindow(
+            run_start - SEARCH_WINDOW,
+            run_start + SEARCH_WINDOW,
+            mark - SYNC_OVERLAP if mark else fallback,
+        )
+    return windows
 
-    res_body = res.json()
-    if res_body.get("access_token"):
-        API_TOKEN = str(res_body["access_token"])
-        return True
-    else:
-        error(res_body.get(".error"))
-        return False
 
+def split_window(
+    window: SearchWindow,
+    record_count: int,
+    shard_pages: int = SHARD_PAGES,
+    page_size: int = PAGE_SIZE,
+) -> List[SearchWindow]:
+    """
+    Sub-windows of `window` that hold at most `shard_pages` pages each
+
+    Orders are assumed to be spread evenly over OrderDate, and sub-windows
+    are sized for half of `shard_pages`, so one up to twice as dense as the
+    average still fits; a denser one is split again once its own
+    RecordCount is known.
+    Neighbours share their boundary second, so an order dated exactly on it
+    is returned by both. Empty if `window` is small enough as it is.
+    """
+    if shard_pages <= 0 or record_count <= shard_pages * page_size:
+        return []
+    span = window.order_date_end - window.order_date_start
+    parts = min(
+        math.ceil(2 * record_count / (shard_pages * page_size)),
+        int(span / MIN_SHARD_WINDOW),
+    )
+    if parts < 2:
+        return []
+    bounds = [
+        (window.order_date_start + span * i / parts).replace(microsecond=0)
+        for i in range(parts)
+    ]
+    bounds.append(window.order_date_end)
+    return [
+        window._replace(order_date_start=start, order_date_end=end)
+        for start, end in zip(bounds, bounds[1:])
+    ]
+
+
+def record_count(response_data: Dict[str, Any]) -> int:
+    """Read RecordCount from a search response, falling back to the first order"""
+    count = response_data.get("RecordCount")
+    if count is None:
+        data = response_data.get("Data") or []
+        if data:
+            count = data[0].get("RecordCount")
+    try:
+        return int(count) if count is not None else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def record_high_water(
+    run: ShipmentOrderRun, warehouse: int, orders: List[Dict[str, Any]]
+) -> None:
+    """Raise the warehouse's high-water mark to the latest LastModifiedDate in `orders`"""
+    marks = run.high_water_marks
+    for order in orders:
+        modified = parse_datetime(order.get("LastModifiedDate"))
+        if modified is not None and (warehouse not in marks or modified > marks[warehouse]):
+            marks[warehouse] = modified
+
+
+class FetchProgress:
+    """Per-shard checkpoints of a fetch, saved as pages are staged"""
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        run: ShipmentOrderRun,
+        checkpoints: List[FetchCheckpoint],
+        tuner: Optional[PageSizeTuner] = None,
+    ):
+        self.pool = pool
+        self.run = run
+        self.tuner = tuner or PageSizeTuner()
+        self.checkpoints: Dict[ShardKey, FetchCheckpoint] = {
+            (checkpoint.warehouse_id, checkpoint.shard): checkpoint for checkpoint in checkpoints
+        }
+        # pages staged beyond each shard's last contiguous one (async fetch)
+        self.staged: Dict[ShardKey, Set[int]] = defaultdict(set)
+        # IDs of the orders staged by this run, per warehouse
+        self.seen: Dict[int, Set[Any]] = defaultdict(set)
+
+    @classmethod
+    def start(
+        cls,
+        pool: ConnectionPool,
+        run: ShipmentOrderRun,
+        warehouses: List[int],
+        resume: bool = RESUME,
+        full_sync: bool = FULL_SYNC,
+    ) -> "FetchProgress":
+        """Resume the unfinished fetch, if any, adding warehouses it did not cover"""
+        existing = pool.run(load_checkpoints) if resume else []
+        if not resume:
+            pool.run(clear_checkpoints)
+        elif existing:
+            done = sum(checkpoint.completed for checkpoint in existing)
+            info(
+                f"Resuming an unfinished fetch: {done}/{len(existing)} shards done, "
+                f"{sum(c.last_page for c in existing if not c.completed)} pages staged"
+            )
 
-def get_warehouses() -> Optional[List[int]]:
-    url = "https://hubapi.logiwa.com/en/api/IntegrationApi/LookUp"
-    headers = {
-        "Authorization": f"Bearer {API_TOKEN}",
-        "Content-Type": "application/json",
-    }
-    params = {
-        "LookupList": [2],  # get warehouse IDs only
-    }
-    res = requests.post(url, json=params, headers=headers)
-    response_data = res.json()
-    if res.status_code != 200:
-        error(response_data)
-        return None
-    else:
-        warehouses = [
-            warehouse["Id"]
-            for warehouse in response_data["Lookup"].get("WarehouseList")
+        resumed = {checkpoint.warehouse_id for checkpoint in existing}
+        new = [warehouse for warehouse in warehouses if warehouse not in resumed]
+        windows = pool.run(
+            lambda conn: search_windows(conn, new, run.fetch_timestamp, full_sync)
+        )
+        tuner = PageSizeTuner(pool.run(load_page_sizes))
+        fresh = [
+            FetchCheckpoint(warehouse, 0, tuner.size(warehouse), *windows[warehouse])
+            for warehouse in new
         ]
-        return warehouses
+        checkpoints = [c for c in existing if c.warehouse_id in warehouses] + fresh
+
+        marks = run.high_water_marks
+        for checkpoint in checkpoints:
+            mark = checkpoint.high_water_mark
+            warehouse = checkpoint.warehouse_id
+            if mark is not None and (warehouse not in marks or mark > marks[warehouse]):
+                marks[warehouse] = mark
+        # record the frozen windows before the first page is fetched
+        pool.run(lambda conn: save_checkpoints(conn, fresh))
+        return cls(pool, run, checkpoints, tuner)
+
+    def _write(self, write: Callable[..., None], *args) -> None:
+        """Save progress with `write(conn, *args)`, reconnecting if the connection dropped"""
+        self.pool.run(lambda conn: write(conn, *args))
+
+    def pending(self) -> List[ShardKey]:
+        """Shards with pages left to fetch"""
+        return [shard for shard, checkpoint in self.checkpoints.items() if not checkpoint.completed]
+
+    def window(self, shard: ShardKey) -> SearchWindow:
+        checkpoint = self.checkpoints[shard]
+        return SearchWindow(
+            checkpoint.order_date_start,
+            checkpoint.order_date_end,
+            checkpoint.last_modified_start,
+        )
+
+    def begin(self, shard: ShardKey) -> None:
+        """
+        Fix the shard's PageSize before paging it: the tuned size if no page
+        is staged yet, else its own size, halved while the tuned size is no
+        more than half of it (so the pages staged stay aligned)
+        """
+        checkpoint = self.checkpoints[shard]
+        size = self.tuner.size(shard[0])
+        page_size, last_page = checkpoint.page_size, checkpoint.last_page
+        if not last_page:
+            page_size = size
+        while size <= page_size // 2 and page_size % 2 == 0:
+            page_size //= 2
+            last_page *= 2
+        if (page_size, last_page) != (checkpoint.page_size, checkpoint.last_page):
+            checkpoint.page_size, checkpoint.last_page = page_size, last_page
+            self._write(update_checkpoint, checkpoint)
+
+    def page_size(self, shard: ShardKey) -> int:
+        return self.checkpoints[shard].page_size
+
+    def next_page(self, shard: ShardKey) -> int:
+        """The first page not yet staged"""
+        return self.checkpoints[shard].last_page + 1
+
+    def _shards_of(self, warehouse: int) -> List[FetchCheckpoint]:
+        return [c for (w, _), c in self.checkpoints.items() if w == warehouse]
+
+    def split(self, shard: ShardKey, records: int) -> List[ShardKey]:
+        """
+        Replace a shard with nothing staged yet by sub-windows, if it holds
+        `records` orders, more than SHARD_PAGES pages; returns the new shards,
+        or nothing if the shard is to be fetched as it is
+        """
+        checkpoint = self.checkpoints[shard]
+        if checkpoint.last_page or self.staged[shard]:
+            return []
+        windows = split_window(self.window(shard), records, page_size=checkpoint.page_size)
+        if not windows:
+            return []
+
+        warehouse = checkpoint.warehouse_id
+        first = max(number for w, number in self.checkpoints if w == warehouse) + 1
+        del self.checkpoints[shard]
+        shards = []
+        for number, window in enumerate(windows, first):
+            self.checkpoints[warehouse, number] = FetchCheckpoint(
+                warehouse, number, checkpoint.page_size, *window
+            )
+            shards.append((warehouse, number))
+        self._write(save_checkpoints, self._shards_of(warehouse))
+        debug(
+            f"Warehouse {warehouse}: {records} orders, "
+            f"shard {shard[1]} split into {len(windows)}"
+        )
+        return shards
+
+    def unseen(
+        self, warehouse: int, orders: List[Dict[str, Any]], raw_orders: Optional[List[str]]
+    ) -> Page:
+        """Drop the orders already staged by this run, e.g. by a neighbouring shard"""
+        seen = self.seen[warehouse]
+        keep = []
+        for index, order in enumerate(orders):
+            order_id = order.get("ID")
+            if order_id is None or order_id not in seen:
+                seen.add(order_id)
+                keep.append(index)
+        if len(keep) == len(orders):
+            return orders, raw_orders
+        debug(f"Warehouse {warehouse}: {len(orders) - len(keep)} orders already staged")
+        return (
+            [orders[index] for index in keep],
+            None if raw_orders is None else [raw_orders[index] for index in keep],
+        )
+
+    def stage_page(
+        self,
+        shard: ShardKey,
+        page_index: int,
+        orders: List[Dict[str, Any]],
+        raw_orders: Optional[List[str]],
+        stage: StageOrders,
+    ) -> None:
+        """Stage the page's orders not yet staged by this run, then checkpoint it"""
+        warehouse = shard[0]
+        orders, raw_orders = self.unseen(warehouse, orders, raw_orders)
+        if orders:
+            record_high_water(self.run, warehouse, orders)
+            self.run.orders_fetched += len(orders)
+            with self.run.metrics.phase("stage"):
+                # staging replaces the page's orders, so a retry after a drop is safe
+                self.run.orders_skipped += self.pool.run(
+                    lambda conn: stage(conn, orders, raw_orders)
+                )
+        self.page_staged(shard, page_index)
+
+    def page_staged(self, shard: ShardKey, page_index: int) -> None:
+        """Record a staged page; the checkpoint moves once no earlier page is missing"""
+        checkpoint = self.checkpoints[shard]
+        staged = self.staged[shard]
+        staged.add(page_index)
+        last_page = checkpoint.last_page
+        while last_page + 1 in staged:
+            last_page += 1
+            staged.discard(last_page)
+        if last_page != checkpoint.last_page:
+            checkpoint.last_page = last_page
+            checkpoint.high_water_mark = self.run.high_water_marks.get(shard[0])
+            self._write(update_checkpoint, checkpoint)
+
+    def shard_done(self, shard: ShardKey) -> None:
+        """
+        Every page of the shard is staged; once that holds for every shard of
+        its warehouse, save the warehouse's high-water mark
+        """
+        warehouse = shard[0]
+        mark = self.run.high_water_marks.get(warehouse)
+        checkpoint = self.checkpoints[shard]
+        checkpoint.completed = True
+        checkpoint.high_water_mark = mark
+        self._write(update_checkpoint, checkpoint)
+        if mark is not None and all(c.completed for c in self._shards_of(warehouse)):
+            self._write(save_sync_state, {warehouse: mark})
+
+    def finish(self) -> bool:
+        """
+        Save the tuned page sizes and clear the checkpoints if every
+        warehouse is done; False if the fetch is partial
+        """
+        self._write(save_page_sizes, self.tuner.sizes)
+        if self.pending():
+            self.run.partial = True
+            return False
+        self._write(clear_checkpoints)
+        return True
 
 
-def fetch_page(
+def build_search_params(
     warehouse: int,
     page_index: int,
-    window: timedelta,
-    headers: Dict[str, str],
-    url: str,
-    last_modified_date: Optional[datetime],
-) -> Optional[List[Dict[str, Any]]]:
-    """Fetch a single page of data"""
+    window: SearchWindow,
+    page_size: int = PAGE_SIZE,
+) -> Dict[str, Any]:
+    """Build the WarehouseOrderSearch request body for a single page"""
     params = {
-        "OrderDate_Start": (datetime.now() - window).strftime("%m.%d.%Y %H:%M:%S"),
-        "OrderDate_End": (datetime.now() + window).strftime("%m.%d.%Y %H:%M:%S"),
+        "OrderDate_Start": window.order_date_start.strftime("%m.%d.%Y %H:%M:%S"),
+        "OrderDate_End": window.order_date_end.strftime("%m.%d.%Y %H:%M:%S"),
         "IsGetOrderDetails": True,
         "IsGetCustomerAddressInfo": True,
         "WarehouseID": warehouse,
-        "PageSize": 200,
+        "PageSize": page_size,
         "SelectedPageIndex": page_index,
     }
-    if last_modified_date:
-        params["LastModifiedDate_Start"] = last_modified_date.strftime(
+    if window.last_modified_start:
+        params["LastModifiedDate_Start"] = window.last_modified_start.strftime(
             "%m.%d.%Y %H:%M:%S"
         )
+    return params
 
-    response = requests.post(url, json=params, headers=headers)
-    if response.status_code == 403:
-        time.sleep(2)
-        # recursively call it incase it continues to fail
-        return fetch_page(
-            warehouse,
-            page_index,
-            window,
-            headers,
-            url,
-            last_modified_date,
+
+def fetch_page(
+    client: LogiwaClient,
+    warehouse: int,
+    page_index: int,
+    window: SearchWindow,
+    page_size: int = PAGE_SIZE,
+    tuner: Optional[PageSizeTuner] = None,
+) -> Tuple[Dict[str, Any], Optional[List[str]]]:
+    """
+    Fetch a single page of data
+
+    Returns the full response body and, when available, the JSON text of
+    each order in Data (see models.jsoncodec.split_search_response). The
+    page's timing, size and any server errors are reported to `tuner`.
+    """
+    params = build_search_params(warehouse, page_index, window, page_size)
+
+    for attempt in range(MAX_RETRIES + 1):
+        response = client.post(SEARCH_PATH, json=params, headers=client.auth_headers())
+        if tuner and response.status_code >= 500:
+            tuner.failed(warehouse, page_size)
+
+        if response.status_code not in RETRYABLE_STATUS or attempt == MAX_RETRIES:
+            break
+
+        delay = retry_delay(attempt, response.headers)
+        debug(
+            f"Warehouse {warehouse}, Page {page_index}: "
+            f"HTTP {response.status_code}, retrying in {delay:.1f}s"
         )
+        client.record_retry(delay)
+        time.sleep(delay)
 
-    response_data = response.json()
-    data = response_data.get("Data", [])
+    response.raise_for_status()
+
+    response_data, raw_orders = split_search_response(response.content)
+    data = response_data.get("Data") or []
     debug(f"Warehouse {warehouse}, Page {page_index}: Received {len(data)} orders")
+    if tuner:
+        tuner.observe(
+            warehouse,
+            page_size,
+            response.elapsed.total_seconds(),
+            len(response.content),
+            len(data),
+        )
 
-    return data if data else None
+    return response_data, raw_orders
 
 
-def fetch_warehouse_pages(
-    conn: Connection,
-    warehouse: int,
-    window: timedelta,
-    headers: Dict[str, str],
-    url: str,
-    last_modified_date: Optional[datetime],
+def fetch_shard_pages(
+    client: LogiwaClient,
+    progress: FetchProgress,
+    shard: ShardKey,
+    stage: StageOrders = insert_staging_orders,
 ):
-    """Fetch all pages for a single warehouse"""
-    debug(f"Processing shipments out of warehouse {warehouse}")
-    page_index = 1
+    """
+    Fetch the remaining pages of one shard of a warehouse, checkpointing each
+    one; a shard found to be too large is split instead (see FetchProgress)
+    """
+    warehouse = shard[0]
+    debug(f"Processing shipments out of warehouse {warehouse}, shard {shard[1]}")
+    progress.begin(shard)
+    window = progress.window(shard)
+    page_size = progress.page_size(shard)
+    page_index = progress.next_page(shard)
 
-    delete_query = (
-        "DELETE FROM dbo.ShipmentOrder_Staging WHERE order_id = %s"  # pymssql
-    )
-    insert_query = """
-    INSERT INTO dbo.ShipmentOrder_Staging (order_id, raw_json, fetch_timestamp)
-    VALUES (%s, %s, %s)
-    """  # pymssql
-
-    # delete_query = "DELETE FROM ShipmentOrder_Staging WHERE order_id = ?"  # sqlite3
-    # insert_query = """
-    # INSERT INTO ShipmentOrder_Staging (order_id, raw_json, fetch_timestamp)
-    # VALUES (?, ?, ?)
-    # """  # sqlite3
-
-    cur = conn.cursor()
     while True:
-        orders = fetch_page(
-            warehouse,
-            page_index,
-            window,
-            headers,
-            url,
-            last_modified_date,
+        response_data, raw_orders = fetch_page(
+            client, warehouse, page_index, window, page_size, progress.tuner
         )
-        if orders is None:
+        if page_index == 1 and progress.split(shard, record_count(response_data)):
+            return  # the sub-windows are fetched in its place
+        orders = response_data.get("Data") or []
+        if not orders:
             break
 
-        for order in orders:
-            order_id = order.get("ID")
-            raw_json = json.dumps(order)
-            fetch_timestamp = datetime.now()
-
-            cur.execute(delete_query, (order_id,))
-            cur.execute(
-                insert_query,
-                (
-                    order_id,
-                    raw_json,
-                    fetch_timestamp,
-                ),
-            )
-
+        progress.stage_page(shard, page_index, orders, raw_orders, stage)
         page_index += 1
 
-    conn.commit()
-
-
-# create new table with
-# order_date   = 10/21
-# modified_date = 10/22
-# dbo.ShipmentOrder_Retrievals (datetime)
-# store the datetime of the most recent successful run
+    progress.shard_done(shard)
 
 
-def get_shipments(conn: Connection) -> bool:
+def get_shipments(
+    pool: ConnectionPool,
+    client: LogiwaClient,
+    run: ShipmentOrderRun,
+    stage: StageOrders = insert_staging_orders,
+) -> bool:
     """
     Queries the Logiwa API synchronously and returns a boolean indicating Success (True) or failure (False)
-    Shipments are only queried within the past or next 45 days
-
-    Shipments are stored in a staging table for future access
+    Shipments are only queried within the past or next 45 days, and only
+    those modified since each warehouse's high-water mark (see search_windows)
+
+    Shipments are stored in a staging table by `stage` for future access, except those
+    unchanged since they were last loaded; counts and timings are added to `run`.
+    Staging and checkpoints are written over `pool`, which reconnects if the
+    connection drops. Large windows are fetched as several shards (see FetchProgress). A shard
+    that fails does not stop the others; the fetch is then partial and is
+    resumed by the next run
     """
-    warehouses = get_warehouses()
-    if not warehouses:
-        return False
-
-    url = "https://hubapi.logiwa.com/en/api/IntegrationApi/WarehouseOrderSearch"
-    headers = {
-        "Authorization": f"Bearer {API_TOKEN}",
-        "Content-Type": "application/json",
-    }
-
-    window = timedelta(days=45)
-    last_modified_date_stored = last_fetched_date(conn)
-
-    # Fetch all warehouses sequentially
-    for warehouse in warehouses:
-        fetch_warehouse_pages(
-            conn,
-            warehouse,
-            window,
-            headers,
-            url,
-            last_modified_date_stored,
-        )
-
-    return True
+    try:
+        with run.metrics.phase("fetch"):
+            warehouses = client.get_warehouses()
+            if not warehouses:
+                return False
+
+            progress = FetchProgress.start(pool, run, warehouses)
+
+            # Fetch all shards sequentially; those split off a shard come last
+            failed: Set[ShardKey] = set()
+            while True:
+                shards = [shard for shard in progress.pending() if shard not in failed]
+                if not shards:
+                    break
+                for shard in shards:
+                    try:
+                        fetch_shard_pages(client, progress, shard, stage)
+                    except (requests.RequestException, ValueError) as e:
+                        error(f"Warehouse {shard[0]}, shard {shard[1]}: {e}")
+                        if isinstance(e, requests.Timeout):
+                            progress.tuner.failed(shard[0], progress.page_size(shard))
+                        failed.add(shard)
+
+            complete = progress.finish()
+    finally:
+        client.record_metrics(run)
+    info(f"Logiwa API: {client.summary()}")
+    return complete
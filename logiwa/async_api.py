@@ -0,0 +1,216 @@
+"""
+Concurrent fetch engine for the Logiwa WarehouseOrderSearch API
+
+Pages for every warehouse, and for every shard of a large one, are requested
+in parallel (bounded by MAX_CONCURRENT_REQUESTS) and written to the staging
+table as they arrive, with progress checkpointed as in the sync path (see
+logiwa.api.FetchProgress).
+"""
+
+import asyncio
+import os
+import time
+from logging import debug, error, info
+from typing import Optional, List, Dict, Any, Set, Tuple
+
+import aiohttp
+
+from logiwa import api
+from logiwa.pagesize import PageSizeTuner
+from logiwa.ratelimit import RETRYABLE_STATUS, retry_delay
+from models.database import insert_staging_orders
+from models.jsoncodec import split_search_response
+from models.datastructs import ShipmentOrderRun
+from models.pool import ConnectionPool
+
+
+# Maximum number of WarehouseOrderSearch requests in flight at once
+MAX_CONCURRENT_REQUESTS = int(os.getenv("LOGIWA_MAX_CONCURRENCY", "8"))
+
+
+async def fetch_page_async(
+    client: api.LogiwaClient,
+    session: aiohttp.ClientSession,
+    semaphore: asyncio.Semaphore,
+    warehouse: int,
+    page_index: int,
+    window: api.SearchWindow,
+    page_size: int = api.PAGE_SIZE,
+    tuner: Optional[PageSizeTuner] = None,
+) -> Tuple[Dict[str, Any], Optional[List[str]]]:
+    """logiwa.api.fetch_page over an aiohttp session, at most `semaphore` pages at once"""
+    params = api.build_search_params(warehouse, page_index, window, page_size)
+
+    url = client.url(api.SEARCH_PATH)
+    token = client.token
+    headers = client.auth_headers()
+    refreshed = False
+
+    for attempt in range(api.MAX_RETRIES + 1):
+        await client.limiter.acquire_async()
+        async with semaphore:
+            started = time.monotonic()
+            async with session.post(url, json=params, headers=headers) as response:
+                headers_seconds = time.monotonic() - started
+                status = response.status
+                retry_headers = response.headers
+                expired = status == 401 and not refreshed and attempt < api.MAX_RETRIES
+                if not expired and (
+                    status not in RETRYABLE_STATUS or attempt == api.MAX_RETRIES
+                ):
+                    response.raise_for_status()
+                    body = await response.read()
+                    client.record_bytes(response.headers.get("Content-Length"), body)
+                    response_data, raw_orders = split_search_response(body)
+            client.record_request(time.monotonic() - started)
+        if tuner and status >= 500:
+            tuner.failed(warehouse, page_size)
+
+        if expired:
+            # token expired mid-run: replace it once, then send again
+            refreshed = True
+            await asyncio.to_thread(client.refresh_token, token)
+            token = client.token
+            headers = client.auth_headers()
+            continue
+        if status not in RETRYABLE_STATUS:
+            break
+
+        # wait outside the semaphore so other requests can proceed
+        delay = retry_delay(attempt, retry_headers)
+        debug(
+            f"Warehouse {warehouse}, Page {page_index}: "
+            f"HTTP {status}, retrying in {delay:.1f}s"
+        )
+        client.record_retry(delay)
+        await asyncio.sleep(delay)
+
+    data = response_data.get("Data") or []
+    debug(f"Warehouse {warehouse}, Page {page_index}: Received {len(data)} orders")
+    if tuner:
+        tuner.observe(warehouse, page_size, headers_seconds, len(body), len(data))
+    return response_data, raw_orders
+
+
+async def fetch_all_pages(
+    client: api.LogiwaClient,
+    progress: api.FetchProgress,
+    stage: api.StageOrders = insert_staging_orders,
+) -> bool:
+    """
+    Fetch every remaining page of every shard concurrently
+
+    The first page not yet staged of each shard is requested up front; its
+    RecordCount (see logiwa.api.record_count) is used to schedule the
+    remaining pages in parallel. If the API does not report a RecordCount,
+    pages are walked one at a time until an empty page. A shard whose first page shows it is too large is split, and
+    the first pages of its sub-windows are requested instead, so a large
+    warehouse is fetched as several windows in parallel. A shard is done
+    once all its pages are staged; one with a failed page is left to be
+    resumed.
+    """
+    success = True
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    pending: Dict[asyncio.Task, Tuple[api.ShardKey, int]] = {}
+    outstanding: Dict[api.ShardKey, int] = {}
+    first_pages: Dict[api.ShardKey, int] = {}
+    sequential: Set[api.ShardKey] = set()
+    failed: Set[api.ShardKey] = set()
+
+    async with client.async_session(MAX_CONCURRENT_REQUESTS) as session:
+
+        def schedule(shard: api.ShardKey, page_index: int):
+            task = asyncio.create_task(
+                fetch_page_async(
+                    client,
+                    session,
+                    semaphore,
+                    shard[0],
+                    page_index,
+                    progress.window(shard),
+                    progress.page_size(shard),
+                    progress.tuner,
+                )
+            )
+            pending[task] = (shard, page_index)
+            outstanding[shard] = outstanding.get(shard, 0) + 1
+
+        def start(shard: api.ShardKey):
+            debug(f"Processing shipments out of warehouse {shard[0]}, shard {shard[1]}")
+            progress.begin(shard)
+            first_pages[shard] = progress.next_page(shard)
+            schedule(shard, first_pages[shard])
+
+        for shard in progress.pending():
+            start(shard)
+
+        while pending:
+            done, _ = await asyncio.wait(
+                pending.keys(), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                shard, page_index = pending.pop(task)
+                warehouse = shard[0]
+                outstanding[shard] -= 1
+                try:
+                    response_data, raw_orders = task.result()
+                except Exception as e:
+                    error(f"Warehouse {warehouse}, shard {shard[1]}, Page {page_index}: {e}")
+                    if isinstance(e, asyncio.TimeoutError):
+                        progress.tuner.failed(warehouse, progress.page_size(shard))
+                    success = False
+                    failed.add(shard)
+                    continue
+
+                first = page_index == first_pages[shard]
+                if first and page_index == 1:
+                    shards = progress.split(shard, api.record_count(response_data))
+                    if shards:
+                        for sub in shards:
+                            start(sub)
+                        continue
+
+                data = response_data.get("Data") or []
+                if data:
+                    progress.stage_page(shard, page_index, data, raw_orders, stage)
+
+                if first:
+                    records = api.record_count(response_data)
+                    if records:
+                        page_count = -(-records // progress.page_size(shard))
+                        for next_page in range(page_index + 1, page_count + 1):
+                            schedule(shard, next_page)
+                    else:
+                        sequential.add(shard)
+
+                if shard in sequential and data:
+                    schedule(shard, page_index + 1)
+
+                if not outstanding[shard] and shard not in failed:
+                    progress.shard_done(shard)
+
+    return success
+
+
+def get_shipments_async(
+    pool: ConnectionPool,
+    client: api.LogiwaClient,
+    run: ShipmentOrderRun,
+    stage: api.StageOrders = insert_staging_orders,
+) -> bool:
+    """logiwa.api.get_shipments with the pages fetched concurrently (see fetch_all_pages)"""
+    try:
+        with run.metrics.phase("fetch"):
+            warehouses = client.get_warehouses()
+            if not warehouses:
+                return False
+
+            progress = api.FetchProgress.start(pool, run, warehouses)
+
+            asyncio.run(fetch_all_pages(client, progress, stage))
+
+            success = progress.finish()
+    finally:
+        client.record_metrics(run)
+    info(f"Logiwa API: {client.summary()}")
+    return success
@@ -0,0 +1,76 @@
+"""
+On-disk cache for values that outlive a run
+
+Holds the bearer token until it expires and LookUp results for a TTL, so a
+run that starts shortly after the last one skips those round trips. The
+cache is a small JSON file, readable only by its owner since it holds a
+token; a missing or unreadable file is treated as empty.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Cache file; empty keeps the cache in memory for the run only
+CACHE_PATH = os.getenv("LOGIWA_CACHE_PATH", ".logiwa-cache.json")
+
+
+class DiskCache:
+    """Values with an expiry time, written through to a JSON file"""
+
+    def __init__(self, path: str = CACHE_PATH, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = self._read()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path:
+            return {}
+        try:
+            with open(self.path) as source:
+                entries = json.load(source)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"ignoring unreadable cache {self.path}: {e}")
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _write(self) -> None:
+        if not self.path:
+            return
+        partial = f"{self.path}.tmp"
+        try:
+            fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as out:
+                json.dump(self.entries, out)
+            os.replace(partial, self.path)
+        except OSError as e:
+            logging.warning(f"could not write cache {self.path}: {e}")
+
+    def get(self, key: str) -> Optional[Any]:
+        """The value stored under `key`, or None if missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry or entry.get("expires", 0) <= self.clock():
+                return None
+            return entry.get("value")
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self.lock:
+            now = self.clock()
+            # drop anything expired while rewriting the file anyway
+            self.entries = {
+                k: entry for k, entry in self.entries.items() if entry.get("expires", 0) > now
+            }
+            self.entries[key] = {"value": value, "expires": now + ttl}
+            self._write()
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self._write()
@@ -0,0 +1,108 @@
+"""
+PageSize tuning for WarehouseOrderSearch, per warehouse
+
+Larger pages fetch the same orders in fewer requests, but a page of
+detail-heavy orders can keep the API busy long enough to time out. A
+PageSizeTuner sizes each warehouse's pages from the ones it has received:
+the largest page expected to come back within TARGET_SECONDS and
+MAX_PAGE_BYTES, at most twice a size already seen to work, and at most half
+of a size that failed on the server this run. Tuned sizes are saved with the
+fetch, so the next run starts from them.
+"""
+
+import os
+from logging import debug
+from typing import Dict, Optional
+
+# PageSize for warehouses with no tuned size yet
+PAGE_SIZE = int(os.getenv("LOGIWA_PAGE_SIZE", "200"))
+# Bounds for tuned sizes; equal bounds turn tuning off
+PAGE_SIZE_MIN = int(os.getenv("LOGIWA_PAGE_SIZE_MIN", "20"))
+PAGE_SIZE_MAX = int(os.getenv("LOGIWA_PAGE_SIZE_MAX", "500"))
+# Time until a page's response starts, kept well within the API's timeout
+TARGET_SECONDS = float(os.getenv("LOGIWA_PAGE_TARGET_SECONDS", "10"))
+# Largest page body, uncompressed
+MAX_PAGE_BYTES = int(os.getenv("LOGIWA_PAGE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Weight of the latest page in the per-order averages
+SMOOTHING = 0.3
+# Sizes are rounded down to a multiple of this, so they do not drift by an order or two
+SIZE_STEP = 10
+
+
+def _smooth(average: Optional[float], value: float) -> float:
+    return value if average is None else average + SMOOTHING * (value - average)
+
+
+class PageSizeTuner:
+    """
+    Current PageSize of each warehouse, adjusted as pages come back
+
+    Each page's response time and size are averaged per order, which
+    overstates the cost of an order by the request's fixed overhead and so
+    errs towards smaller pages. Pages less than half full (the last page of
+    a window) are mostly overhead and are not learned from.
+    """
+
+    def __init__(
+        self,
+        sizes: Optional[Dict[int, int]] = None,
+        initial: int = PAGE_SIZE,
+        minimum: int = PAGE_SIZE_MIN,
+        maximum: int = PAGE_SIZE_MAX,
+        target_seconds: float = TARGET_SECONDS,
+        max_bytes: int = MAX_PAGE_BYTES,
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.initial = self._clamp(initial)
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.sizes: Dict[int, int] = {
+            warehouse: self._clamp(size) for warehouse, size in (sizes or {}).items()
+        }
+        self.seconds_per_order: Dict[int, float] = {}
+        self.bytes_per_order: Dict[int, float] = {}
+        # largest size allowed for the rest of the run after a failure
+        self.ceilings: Dict[int, int] = {}
+
+    def _clamp(self, size: float) -> int:
+        size = int(size)
+        if size >= 2 * SIZE_STEP:
+            size -= size % SIZE_STEP
+        return max(self.minimum, min(self.maximum, size))
+
+    def size(self, warehouse: int) -> int:
+        """PageSize for the warehouse's next window"""
+        return self.sizes.get(warehouse, self.initial)
+
+    def _set(self, warehouse: int, size: int) -> None:
+        if size != self.size(warehouse):
+            debug(f"Warehouse {warehouse}: PageSize {self.size(warehouse)} -> {size}")
+        self.sizes[warehouse] = size
+
+    def observe(
+        self, warehouse: int, page_size: int, seconds: float, body_bytes: int, orders: int
+    ) -> None:
+        """Learn from a page of `orders` orders that started arriving after `seconds`"""
+        if not orders or orders < page_size / 2:
+            return
+        per_order = self.seconds_per_order[warehouse] = _smooth(
+            self.seconds_per_order.get(warehouse), seconds / orders
+        )
+        bytes_per_order = self.bytes_per_order[warehouse] = _smooth(
+            self.bytes_per_order.get(warehouse), body_bytes / orders
+        )
+        fits = min(
+            self.target_seconds / max(per_order, 1e-6),
+            self.max_bytes / max(bytes_per_order, 1.0),
+            2 * page_size,
+            self.ceilings.get(warehouse, self.maximum),
+        )
+        self._set(warehouse, self._clamp(fits))
+
+    def failed(self, warehouse: int, page_size: int) -> None:
+        """A page of `page_size` orders timed out or failed on the server"""
+        ceiling = self._clamp(page_size // 2)
+        self.ceilings[warehouse] = min(ceiling, self.ceilings.get(warehouse, ceiling))
+        self._set(warehouse, min(self.size(warehouse), self.ceilings[warehouse]))
@@ -0,0 +1,100 @@
+"""
+Request pacing and retry backoff for the Logiwa API
+
+A single RateLimiter is shared by the sync and async fetch paths so both stay
+within the account's request budget.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Mapping, Optional
+
+
+# Responses that mean "slow down / try again later"
+RETRYABLE_STATUS = {403, 429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """
+    Token bucket limiter
+
+    Tokens refill at requests_per_minute / 60 per second up to `burst`.
+    Callers reserve a token and sleep for however long the bucket needs to
+    refill, so concurrent callers are spaced out instead of stampeding.
+    Also keeps totals of time spent waiting vs. transferring.
+    """
+
+    def __init__(self, requests_per_minute: int, burst: int = 1):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+        self.requests = 0
+        self.retries = 0
+        self.wait_seconds = 0.0
+        self.backoff_seconds = 0.0
+        self.transfer_seconds = 0.0
+
+    def _reserve(self) -> float:
+        """Take a token, returning how long the caller must wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            self.requests += 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.wait_seconds += delay
+            return delay
+
+    def acquire(self) -> None:
+        """Block until a request may be sent"""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        """Wait until a request may be sent without blocking the event loop"""
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record_transfer(self, seconds: float) -> None:
+        with self.lock:
+            self.transfer_seconds += seconds
+
+    def record_backoff(self, seconds: float) -> None:
+        with self.lock:
+            self.retries += 1
+            self.backoff_seconds += seconds
+
+    def summary(self) -> str:
+        return (
+            f"{self.requests} requests ({self.retries} retries): "
+            f"{self.transfer_seconds:.1f}s transferring, "
+            f"{self.wait_seconds:.1f}s waiting on rate limit, "
+            f"{self.backoff_seconds:.1f}s backing off"
+        )
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with jitter; attempt counts from 0"""
+    delay = min(cap, base * (2**attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def retry_delay(attempt: int, headers: Optional[Mapping[str, str]] = None) -> float:
+    """Delay before retrying, honoring a numeric Retry-After header if sent"""
+    retry_after = headers.get("Retry-After") if headers else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    return backoff_delay(attempt)
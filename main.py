@@ -1,35 +1,79 @@
 import os
 import sys
 
-import pymssql
-from pymssql import Connection
-# import sqlite3
-# from sqlite3 import Connection
-
 from dotenv import load_dotenv
 import logging
 import datetime
-
-from models.database import insert_parsed_data
-from models.parsing import WarehouseOrderParser
-from logiwa.api import get_api_token, get_shipments
-
-
-def process_shipments(conn: Connection) -> bool:
+from functools import partial
+from typing import Optional
+
+from models.database import (
+    bulk_insert_rows,
+    upsert_rows,
+    insert_run,
+    fetch_staging_chunk,
+)
+from models.datastructs import ShipmentOrderRun
+from models.metrics import RunMetrics, export
+from models.parse_pool import ParseStage, split_results
+from models.pool import ConnectionPool, ParallelLoader
+from logiwa.api import LogiwaClient, get_shipments
+from logiwa.async_api import get_shipments_async
+from pipeline import Pipeline
+
+# "async" fetches pages concurrently, "sync" walks them one at a time
+FETCH_MODE = os.getenv("LOGIWA_FETCH_MODE", "async")
+# Parsed orders loaded per database transaction
+LOAD_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "1000"))
+# "replace" deletes and re-inserts each order, "upsert" only rewrites changed rows
+LOAD_MODE = os.getenv("LOAD_MODE", "replace")
+# "phased" fetches everything into staging before loading, "pipelined" loads
+# pages while later ones are still being fetched
+RUN_MODE = os.getenv("RUN_MODE", "phased")
+
+
+def loader(metrics: Optional[RunMetrics] = None):
+    """The batch loader selected by LOAD_MODE, counting rows into `metrics`"""
+    load = upsert_rows if LOAD_MODE == "upsert" else bulk_insert_rows
+    return partial(load, metrics=metrics)
+
+
+def process_shipments(
+    pool: ConnectionPool,
+    load: ParallelLoader,
+    metrics: Optional[RunMetrics] = None,
+) -> bool:
     """
     Transfers all data from the staging table to the final tables
     Returns true if it successfully emptied the staging table. False otherwise.
+
+    Staging is read in chunks of LOAD_BATCH_SIZE ordered by staging id, and
+    each chunk is parsed (across PARSE_WORKERS processes), loaded (across the
+    pool's connections) and removed from staging before the next is read, so
+    memory stays flat regardless of the size of the backlog. Time spent
+    reading, parsing and loading is added to `metrics` if given.
     """
     success = True
-    cur = conn.cursor()
-    select_query = "SELECT raw_json FROM dbo.ShipmentOrder_Staging" # pymssql
-    # select_query = "SELECT raw_json FROM ShipmentOrder_Staging"  # sqlite3
-    cur.execute(select_query)
-    orders = cur.fetchall()
-    for order_data in orders:
-        shipment = WarehouseOrderParser().parse_response(order_data[0])
-        success &= insert_parsed_data(conn, shipment)
-        order_data = cur.fetchone()
+    metrics = metrics if metrics is not None else RunMetrics()
+
+    with ParseStage(metrics=metrics) as parse_stage:
+        last_id = 0
+        while True:
+            with metrics.phase("read_staging"):
+                staged = pool.run(
+                    lambda conn: fetch_staging_chunk(conn, last_id, LOAD_BATCH_SIZE)
+                )
+            if not staged:
+                break
+            last_id = staged[-1][0]
+
+            with metrics.phase("parse"):
+                parsed = parse_stage.parse([raw for _, raw in staged])
+            batch, all_parsed = split_results(parsed)
+            success &= all_parsed
+            # rows that failed stay in staging; last_id moves past them either way
+            with metrics.phase("load"):
+                success &= load(batch)
 
     # return False if any orders failed for any reason
     return success
@@ -37,50 +81,62 @@ def process_shipments(conn: Connection) -> bool:
 
 def main() -> int:
     start_time = datetime.datetime.now()
-    success = False
+    run = ShipmentOrderRun(fetch_timestamp=start_time)
 
-    conn = pymssql.connect(
-        server=os.getenv("SQL_SERVER_NAME"),
-        user=os.getenv("SQL_USER_NAME"),
-        password=os.getenv("SQL_PASSWORD"),
-        database=os.getenv("SQL_DATABASE_NAME"),
-    )
-
-    # conn = sqlite3.connect("shipments.db")
+    # staging and checkpoints get a connection of their own, so the fetch never
+    # waits on the loaders; both reconnect if their connection drops
+    staging = ConnectionPool(1)
+    pool = ConnectionPool()
+    load = ParallelLoader(loader(run.metrics), pool)
+    client = LogiwaClient()
 
     try:
-        if get_api_token():
+        if client.authenticate():
             logging.info("got API token from Logiwa")
         else:
             logging.error("failed to get API token")
             return -1
 
-        shipments = get_shipments(conn)
-        if not shipments:
+        fetch = get_shipments if FETCH_MODE == "sync" else get_shipments_async
+        if RUN_MODE == "pipelined":
+            # replay whatever an earlier run left in staging first
+            loaded = process_shipments(pool, load, run.metrics)
+            pipeline = Pipeline(load, LOAD_BATCH_SIZE, metrics=run.metrics)
+            shipments = pipeline.run(lambda stage: fetch(staging, client, run, stage))
+            loaded &= pipeline.success
+        else:
+            shipments = fetch(staging, client, run)
+        if run.partial:
+            # load what was staged; the next run resumes from the checkpoints
+            logging.error("some pages could not be fetched, the next run will resume")
+        elif not shipments:
             logging.error("failed to get shipments from API")
             return -1
-
-        if process_shipments(conn):
-            conn.cursor().execute("TRUNCATE table dbo.ShipmentOrder_Staging") # pymssql
-            # conn.cursor().execute("DELETE FROM ShipmentOrder_Staging")  # sqlite3
-            conn.commit()
-
-        success = True
-        return 0
+        if run.orders_fetched:
+            logging.info(
+                f"skipped {run.orders_skipped}/{run.orders_fetched} unchanged orders "
+                f"({run.orders_skipped / run.orders_fetched:.0%})"
+            )
+
+        if RUN_MODE != "pipelined":
+            loaded = process_shipments(pool, load, run.metrics)
+        if not loaded:
+            logging.error("some staged orders could not be loaded")
+
+        run.success = True
+        return -1 if run.partial else 0
     except Exception as e:
         logging.error(f"main: {e}")
         return -1
     finally:
-        conn.cursor().execute(
-            "INSERT INTO dbo.ShipmentOrder_Runs (fetch_timestamp, success) VALUES (%s, %s)",
-            (start_time, success),
-        )  # pymssql
-        # conn.cursor().execute(
-        #     "INSERT INTO ShipmentOrder_Runs (fetch_timestamp, success) VALUES (?, ?)",
-        #     (start_time.isoformat(), success),
-        # )  # sqlite3
-        conn.commit()
-        conn.close()
+        run.metrics.add_phase("total", (datetime.datetime.now() - start_time).total_seconds())
+        logging.info(f"run metrics: {run.metrics.summary()}")
+        staging.run(lambda conn: insert_run(conn, run))
+        export(run)
+        load.close()
+        pool.close()
+        staging.close()
+        client.close()
 
 
 if __name__ == "__main__":
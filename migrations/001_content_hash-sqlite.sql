@@ -0,0 +1,7 @@
+-- Content fingerprints for change detection
+-- SQLite Compatible Version
+
+ALTER TABLE ShipmentOrder ADD COLUMN content_hash TEXT;
+
+ALTER TABLE ShipmentOrder_Runs ADD COLUMN orders_fetched INTEGER;
+ALTER TABLE ShipmentOrder_Runs ADD COLUMN orders_skipped INTEGER;
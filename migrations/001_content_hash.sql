@@ -0,0 +1,8 @@
+-- Content fingerprints for change detection
+-- Microsoft SQL Server 2019 (Version 15) Compatible Version
+
+ALTER TABLE dbo.ShipmentOrder ADD content_hash CHAR(64);
+
+ALTER TABLE dbo.ShipmentOrder_Runs ADD
+    orders_fetched INT,
+    orders_skipped INT;
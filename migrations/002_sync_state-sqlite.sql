@@ -0,0 +1,8 @@
+-- Per-warehouse high-water marks for incremental fetches
+-- SQLite Compatible Version
+
+CREATE TABLE ShipmentOrder_SyncState (
+    warehouse_id INTEGER PRIMARY KEY,
+    last_modified_date TIMESTAMP NOT NULL, -- latest LastModifiedDate fetched
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,8 @@
+-- Per-warehouse high-water marks for incremental fetches
+-- Microsoft SQL Server 2019 (Version 15) Compatible Version
+
+CREATE TABLE dbo.ShipmentOrder_SyncState (
+    warehouse_id INT PRIMARY KEY,
+    last_modified_date DATETIME2 NOT NULL, -- latest LastModifiedDate fetched
+    updated_at DATETIME2 DEFAULT GETDATE()
+);
@@ -0,0 +1,23 @@
+-- Optionally compressed staging payloads
+-- SQLite Compatible Version
+
+-- SQLite cannot drop NOT NULL from raw_json in place, so the table is rebuilt
+CREATE TABLE ShipmentOrder_Staging_New (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    raw_json TEXT, -- uncompressed payload (raw_format 'json')
+    raw_payload BLOB, -- compressed payload ('zlib' or 'zstd')
+    raw_format TEXT NOT NULL DEFAULT 'json',
+    fetch_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (order_id) REFERENCES ShipmentOrder(id) ON DELETE CASCADE
+);
+
+INSERT INTO ShipmentOrder_Staging_New (id, order_id, raw_json, fetch_timestamp)
+SELECT id, order_id, raw_json, fetch_timestamp FROM ShipmentOrder_Staging;
+
+DROP TABLE ShipmentOrder_Staging;
+ALTER TABLE ShipmentOrder_Staging_New RENAME TO ShipmentOrder_Staging;
+
+CREATE INDEX idx_warehouse_order_id ON ShipmentOrder_Staging(order_id);
+CREATE UNIQUE INDEX unique_order_custom_status ON ShipmentOrder_Staging(id, order_id);
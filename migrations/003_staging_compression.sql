@@ -0,0 +1,8 @@
+-- Optionally compressed staging payloads
+-- Microsoft SQL Server 2019 (Version 15) Compatible Version
+
+ALTER TABLE dbo.ShipmentOrder_Staging ALTER COLUMN raw_json NVARCHAR(MAX) NULL;
+
+ALTER TABLE dbo.ShipmentOrder_Staging ADD
+    raw_payload VARBINARY(MAX),
+    raw_format VARCHAR(8) NOT NULL DEFAULT 'json';
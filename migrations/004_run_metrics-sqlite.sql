@@ -0,0 +1,9 @@
+-- Timings and counters per run
+-- SQLite Compatible Version
+
+CREATE TABLE ShipmentOrder_RunMetrics (
+    run_id INTEGER NOT NULL REFERENCES ShipmentOrder_Runs(id),
+    metric TEXT NOT NULL, -- e.g. phase_seconds.fetch, rows_written.ShipmentOrder_Line
+    value REAL NOT NULL,
+    PRIMARY KEY (run_id, metric)
+);
@@ -0,0 +1,9 @@
+-- Timings and counters per run
+-- Microsoft SQL Server 2019 (Version 15) Compatible Version
+
+CREATE TABLE dbo.ShipmentOrder_RunMetrics (
+    run_id INT NOT NULL REFERENCES dbo.ShipmentOrder_Runs(id),
+    metric NVARCHAR(200) NOT NULL, -- e.g. phase_seconds.fetch, rows_written.ShipmentOrder_Line
+    value FLOAT NOT NULL,
+    PRIMARY KEY (run_id, metric)
+);
@@ -0,0 +1,15 @@
+-- Per-warehouse fetch checkpoints and partial runs
+-- SQLite Compatible Version
+
+ALTER TABLE ShipmentOrder_Runs ADD COLUMN partial INTEGER NOT NULL DEFAULT 0;
+
+CREATE TABLE ShipmentOrder_FetchCheckpoint (
+    warehouse_id INTEGER PRIMARY KEY,
+    order_date_start TIMESTAMP NOT NULL, -- query window frozen when the fetch started
+    order_date_end TIMESTAMP NOT NULL,
+    last_modified_start TIMESTAMP,
+    last_page INTEGER NOT NULL DEFAULT 0, -- pages 1..last_page are staged
+    completed INTEGER NOT NULL DEFAULT 0,
+    high_water_mark TIMESTAMP, -- latest LastModifiedDate staged so far
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,15 @@
+-- Per-warehouse fetch checkpoints and partial runs
+-- Microsoft SQL Server 2019 (Version 15) Compatible Version
+
+ALTER TABLE dbo.ShipmentOrder_Runs ADD partial BIT NOT NULL DEFAULT 0;
+
+CREATE TABLE dbo.ShipmentOrder_FetchCheckpoint (
+    warehouse_id INT PRIMARY KEY,
+    order_date_start DATETIME2 NOT NULL, -- query window frozen when the fetch started
+    order_date_end DATETIME2 NOT NULL,
+    last_modified_start DATETIME2,
+    last_page INT NOT NULL DEFAULT 0, -- pages 1..last_page are staged
+    completed BIT NOT NULL DEFAULT 0,
+    high_water_mark DATETIME2, -- latest LastModifiedDate staged so far
+    updated_at DATETIME2 DEFAULT GETDATE()
+);
@@ -0,0 +1,18 @@
+-- Fetch checkpoints per OrderDate sub-window (shard) of a warehouse
+-- SQLite Compatible Version
+
+-- Checkpoints only outlive an unfinished fetch, which starts over after this
+DROP TABLE ShipmentOrder_FetchCheckpoint;
+
+CREATE TABLE ShipmentOrder_FetchCheckpoint (
+    warehouse_id INTEGER NOT NULL,
+    shard INTEGER NOT NULL, -- sub-window of the warehouse's OrderDate range
+    order_date_start TIMESTAMP NOT NULL, -- query window frozen when the fetch started
+    order_date_end TIMESTAMP NOT NULL,
+    last_modified_start TIMESTAMP,
+    last_page INTEGER NOT NULL DEFAULT 0, -- pages 1..last_page are staged
+    completed INTEGER NOT NULL DEFAULT 0,
+    high_water_mark TIMESTAMP, -- latest LastModifiedDate staged so far
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (warehouse_id, shard)
+);
@@ -0,0 +1,18 @@
+-- Fetch checkpoints per OrderDate sub-window (shard) of a warehouse
+-- Microsoft SQL Server 2019 (Version 15) Compatible Version
+
+-- Checkpoints only outlive an unfinished fetch, which starts over after this
+DROP TABLE dbo.ShipmentOrder_FetchCheckpoint;
+
+CREATE TABLE dbo.ShipmentOrder_FetchCheckpoint (
+    warehouse_id INT NOT NULL,
+    shard INT NOT NULL, -- sub-window of the warehouse's OrderDate range
+    order_date_start DATETIME2 NOT NULL, -- query window frozen when the fetch started
+    order_date_end DATETIME2 NOT NULL,
+    last_modified_start DATETIME2,
+    last_page INT NOT NULL DEFAULT 0, -- pages 1..last_page are staged
+    completed BIT NOT NULL DEFAULT 0,
+    high_water_mark DATETIME2, -- latest LastModifiedDate staged so far
+    updated_at DATETIME2 DEFAULT GETDATE(),
+    PRIMARY KEY (warehouse_id, shard)
+);
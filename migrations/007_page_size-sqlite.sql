@@ -0,0 +1,10 @@
+-- Per-warehouse PageSize tuning
+-- SQLite Compatible Version
+
+ALTER TABLE ShipmentOrder_FetchCheckpoint ADD COLUMN page_size INTEGER NOT NULL DEFAULT 200;
+
+CREATE TABLE ShipmentOrder_PageSize (
+    warehouse_id INTEGER PRIMARY KEY,
+    page_size INTEGER NOT NULL, -- PageSize tuned for the warehouse, the next run's starting point
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
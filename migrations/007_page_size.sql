@@ -0,0 +1,10 @@
+-- Per-warehouse PageSize tuning
+-- Microsoft SQL Server 2019 (Version 15) Compatible Version
+
+ALTER TABLE dbo.ShipmentOrder_FetchCheckpoint ADD page_size INT NOT NULL DEFAULT 200;
+
+CREATE TABLE dbo.ShipmentOrder_PageSize (
+    warehouse_id INT PRIMARY KEY,
+    page_size INT NOT NULL, -- PageSize tuned for the warehouse, the next run's starting point
+    updated_at DATETIME2 DEFAULT GETDATE()
+);
@@ -0,0 +1,225 @@
+"""
+Database backends
+
+Everything that differs between SQL Server (pymssql) and SQLite (sqlite3):
+placeholder style, schema prefix, clearing a table, datetime binding, how
+many rows go into one INSERT and which errors mean a deadlock or a dropped
+connection. The backend is chosen with DB_BACKEND; code holding a connection
+or cursor looks its backend up with backend_for().
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+# "pymssql" for SQL Server, "sqlite3" for a local SQLite file
+DB_BACKEND = os.getenv("DB_BACKEND", "pymssql")
+# Database file used by the sqlite3 backend
+SQLITE_PATH = os.getenv("SQLITE_PATH", "shipments.db")
+SQLITE_SCHEMA = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tables-sqlite.sql")
+
+# Largest number of parameters SQL Server accepts in one statement
+MAX_STATEMENT_PARAMS = 2000
+
+# A DB-API connection returned by Backend.connect()
+Connection = Any
+
+
+def _driver_errors() -> Tuple[type, ...]:
+    """DB-API Error classes of the installed drivers"""
+    errors: Tuple[type, ...] = (sqlite3.Error,)
+    try:
+        import pymssql
+    except ImportError:
+        return errors
+    return errors + (pymssql.Error,)
+
+
+# Catch with `except Error`, whichever backend raised it
+Error = _driver_errors()
+
+
+class Backend:
+    """Driver-specific SQL and connection handling"""
+
+    name = ""
+    paramstyle = "?"
+    schema = ""
+    # connections worth loading over in parallel
+    pool_size = 1
+
+    def connect(self) -> Connection:
+        raise NotImplementedError
+
+    def table(self, name: str) -> str:
+        """Qualified table name; temp tables (#name) are left as is"""
+        return name if name.startswith("#") else f"{self.schema}{name}"
+
+    def placeholders(self, count: int) -> str:
+        return ", ".join([self.paramstyle] * count)
+
+    def truncate_sql(self, table: str) -> str:
+        """Statement removing every row of `table`"""
+        raise NotImplementedError
+
+    def bind_datetime(self, value: datetime) -> Any:
+        """A datetime in the form the driver binds as a parameter"""
+        return value
+
+    def insert_rows(
+        self, cursor, statement: Callable[[int], str], rows: List[tuple]
+    ) -> None:
+        """
+        Insert `rows` with as few round trips as the driver allows
+
+        `statement(count)` returns an INSERT with a VALUES list of `count` rows.
+        """
+        raise NotImplementedError
+
+    def is_deadlock(self, error: Exception) -> bool:
+        """Whether the transaction failed on a lock conflict and can be retried"""
+        return False
+
+    def is_disconnect(self, error: Exception) -> bool:
+        """Whether the connection is gone and has to be replaced"""
+        return False
+
+
+def _error_code(error: Exception) -> Any:
+    """The server's error number, pymssql's first exception argument"""
+    return error.args[0] if error.args else None
+
+
+class PymssqlBackend(Backend):
+    """SQL Server through pymssql"""
+
+    name = "pymssql"
+    paramstyle = "%s"
+    schema = "dbo."
+    pool_size = 4
+
+    # chosen as deadlock victim
+    DEADLOCK_ERRORS = {1205}
+    # DB-Lib: server unavailable, read/write failed, unable to connect, dead DBPROCESS
+    DISCONNECT_ERRORS = {20003, 20004, 20006, 20009, 20047}
+
+    def connect(self) -> Connection:
+        import pymssql
+
+        return pymssql.connect(
+            server=os.getenv("SQL_SERVER_NAME"),
+            user=os.getenv("SQL_USER_NAME"),
+            password=os.getenv("SQL_PASSWORD"),
+            database=os.getenv("SQL_DATABASE_NAME"),
+        )
+
+    def truncate_sql(self, table: str) -> str:
+        return f"TRUNCATE TABLE {self.table(table)}"
+
+    def insert_rows(
+        self, cursor, statement: Callable[[int], str], rows: List[tuple]
+    ) -> None:
+        # pymssql sends executemany as one statement per row, so batch VALUES
+        # instead, within SQL Server's 1000 row and parameter limits
+        chunk_size = max(1, min(1000, MAX_STATEMENT_PARAMS // len(rows[0])))
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start : start + chunk_size]
+            cursor.execute(statement(len(chunk)), tuple(v for row in chunk for v in row))
+
+    def is_deadlock(self, error: Exception) -> bool:
+        return _error_code(error) in self.DEADLOCK_ERRORS
+
+    def is_disconnect(self, error: Exception) -> bool:
+        import pymssql
+
+        return (
+            isinstance(error, pymssql.InterfaceError)
+            or _error_code(error) in self.DISCONNECT_ERRORS
+        )
+
+
+class SqliteBackend(Backend):
+    """
+    A local SQLite file through sqlite3
+
+    Connections use WAL journaling with relaxed syncing, a larger page cache
+    and in-memory temp storage. Foreign keys are left unenforced (sqlite's
+    default), as staged orders precede their ShipmentOrder row. A new file is
+    created from tables-sqlite.sql.
+    """
+
+    name = "sqlite3"
+    paramstyle = "?"
+    schema = ""
+    pool_size = 1  # one writer at a time per database file
+
+    PRAGMAS = [
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -65536",  # KiB
+        "PRAGMA mmap_size = 268435456",
+    ]
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        # pooled connections opened together must not all create the schema
+        self.schema_lock = threading.Lock()
+
+    def connect(self) -> Connection:
+        # wait out another connection's write (e.g. the pipelined loader);
+        # pooled connections are handed between threads, one at a time
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        with self.schema_lock:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ShipmentOrder'"
+            ).fetchone()
+            if not exists:
+                with open(SQLITE_SCHEMA) as schema:
+                    conn.executescript(schema.read())
+        return conn
+
+    def truncate_sql(self, table: str) -> str:
+        return f"DELETE FROM {self.table(table)}"
+
+    def bind_datetime(self, value: datetime) -> Any:
+        # sqlite3's implicit datetime adapter is deprecated
+        return value.isoformat()
+
+    def insert_rows(
+        self, cursor, statement: Callable[[int], str], rows: List[tuple]
+    ) -> None:
+        cursor.executemany(statement(1), rows)
+
+    def is_deadlock(self, error: Exception) -> bool:
+        # SQLITE_BUSY/SQLITE_LOCKED once the busy timeout has run out
+        return isinstance(error, sqlite3.OperationalError) and "locked" in str(error)
+
+    def is_disconnect(self, error: Exception) -> bool:
+        return isinstance(error, sqlite3.ProgrammingError) and "closed" in str(error)
+
+
+BACKENDS: Dict[str, Backend] = {
+    backend.name: backend for backend in (PymssqlBackend(), SqliteBackend())
+}
+
+
+def get_backend(name: str = DB_BACKEND) -> Backend:
+    """The configured backend"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown DB_BACKEND {name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name]
+
+
+def backend_for(db) -> Backend:
+    """Backend of a connection or cursor, from its driver module"""
+    return get_backend(type(db).__module__.split(".")[0])
+
+
+def connect(name: str = DB_BACKEND) -> Connection:
+    """Open a connection with the configured backend"""
+    return get_backend(name).connect()
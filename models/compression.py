@@ -0,0 +1,64 @@
+"""
+Compressed staging payloads
+
+Staged orders are stored either as plain JSON text in raw_json (format
+"json") or compressed in raw_payload, tagged by raw_format. Order JSON with
+line details is large and repetitive and compresses roughly 3.5x, which
+cuts staging writes, transaction log volume and bytes sent to SQL Server.
+Reading is driven by the stored tag, so rows written with any setting can
+be loaded.
+"""
+
+import logging
+import os
+import zlib
+from typing import Optional, Tuple
+
+# "none" stores plain JSON text; "zlib", or "zstd" when zstandard is installed
+STAGING_COMPRESSION = os.getenv("STAGING_COMPRESSION", "none")
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# (raw_json, raw_payload, raw_format) as stored in ShipmentOrder_Staging
+StoredPayload = Tuple[Optional[str], Optional[bytes], str]
+
+
+def _compression(name: str) -> str:
+    """Validate a STAGING_COMPRESSION value, falling back from zstd to zlib"""
+    if name not in ("none", "zlib", "zstd"):
+        raise ValueError(f"Unknown STAGING_COMPRESSION {name!r}")
+    if name == "zstd" and zstandard is None:
+        logging.warning("zstandard is not installed, compressing staging with zlib")
+        return "zlib"
+    return name
+
+
+COMPRESSION = _compression(STAGING_COMPRESSION)
+
+
+def encode_payload(raw_json: str, compression: str = COMPRESSION) -> StoredPayload:
+    """Staging columns for one order's JSON"""
+    if compression == "zlib":
+        return None, zlib.compress(raw_json.encode("utf-8"), ZLIB_LEVEL), "zlib"
+    if compression == "zstd":
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        return None, compressor.compress(raw_json.encode("utf-8")), "zstd"
+    return raw_json, None, "json"
+
+
+def decode_payload(
+    raw_json: Optional[str], raw_payload: Optional[bytes], raw_format: str
+) -> str:
+    """An order's JSON from its staging columns"""
+    if raw_format == "zlib":
+        return zlib.decompress(raw_payload).decode("utf-8")
+    if raw_format == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd-compressed staging row, but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(raw_payload).decode("utf-8")
+    return raw_json
@@ -2,236 +2,839 @@
 Database insertion module using SQLAlchemy
 """
 
-# from sqlite3 import Error, Connection
-from pymssql import Error, Connection
-
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime
-from dataclasses import asdict
+from dataclasses import fields
 from decimal import Decimal
+from functools import lru_cache
 import logging
+import os
+import random
+import time
+
+from .backends import Connection, Error, backend_for, get_backend
+from .compression import decode_payload, encode_payload
+from .jsoncodec import dumps
+from .metrics import RunMetrics
+from .parsing import content_hash
+from .datastructs import (
+    ShipmentOrder,
+    ShipmentOrderLine,
+    ShipmentOrderAddress,
+    CarrierId,
+    ChannelId,
+    WarehouseOrderStatusId,
+    WarehouseFBAOrderStatusId,
+    CustomStatus,
+    FetchCheckpoint,
+    ShipmentOrderRun,
+    row_converter,
+)
+
+
+# Times a batch is retried after losing a deadlock (or sqlite's busy timeout)
+DEADLOCK_RETRIES = int(os.getenv("DB_DEADLOCK_RETRIES", "3"))
+
+# Rows per multi-row statement; stays under SQL Server's 1000 row VALUES limit
+# and 2100 parameter limit, and sqlite's default 999 variable limit
+STAGING_CHUNK_SIZE = 300
+
+STAGING_COLUMNS = ["order_id", "raw_json", "raw_payload", "raw_format", "fetch_timestamp"]
+
+# Normalized tables in dependency order:
+# (key in parsed data, table, dataclass, order id column, columns not inserted)
+PARSED_TABLES = [
+    (
+        "order",
+        "ShipmentOrder",
+        ShipmentOrder,
+        "id",
+        {"api_fetch_timestamp", "created_at", "updated_at"},
+    ),
+    (
+        "lines",
+        "ShipmentOrder_Line",
+        ShipmentOrderLine,
+        "warehouse_order_id",
+        {"id", "created_at", "updated_at"},
+    ),
+    (
+        "addresses",
+        "ShipmentOrder_Address",
+        ShipmentOrderAddress,
+        "warehouse_order_id",
+        {"id", "created_at", "updated_at"},
+    ),
+    ("channels", "ShipmentOrder_Channel", ChannelId, "order_id", set()),
+    ("carriers", "ShipmentOrder_Carrier", CarrierId, "order_id", set()),
+    ("custom_statuses", "ShipmentOrder_CustomStatus", CustomStatus, "order_id", set()),
+    (
+        "fba_order_statuses",
+        "ShipmentOrder_WarehouseFBAOrderStatus",
+        WarehouseFBAOrderStatusId,
+        "order_id",
+        set(),
+    ),
+    (
+        "warehouse_statuses",
+        "ShipmentOrder_WarehouseOrderStatus",
+        WarehouseOrderStatusId,
+        "order_id",
+        set(),
+    ),
+]
+
+# Inserted columns per table, in the order rows are built
+TABLE_COLUMNS: Dict[str, List[str]] = {
+    table: [f.name for f in fields(cls) if f.name not in excluded]
+    for _, table, cls, _, excluded in PARSED_TABLES
+}
+ORDER_ID_INDEX = TABLE_COLUMNS["ShipmentOrder"].index("id")
+
+# Record -> row tuple per table, compiled once from TABLE_COLUMNS
+ROW_CONVERTERS = {
+    table: row_converter(cls, TABLE_COLUMNS[table])
+    for _, table, cls, _, _ in PARSED_TABLES
+}
+
+# One order's rows per table, as plain tuples in TABLE_COLUMNS order
+OrderRows = Dict[str, List[tuple]]
+
+# Columns identifying a child row when diffing in upsert mode; tables not
+# listed are matched on every column. Line and address ids are assigned by
+# the database (IDENTITY on SQL Server), so neither is matched on its id
+CHILD_KEYS = {
+    "ShipmentOrder_Line": ["warehouse_order_id", "code"],
+    "ShipmentOrder_Address": ["warehouse_order_id", "address_type"],
+}
+
+
+def _driver(db) -> str:
+    """Backend name ("pymssql" or "sqlite3") of a connection or cursor"""
+    return backend_for(db).name
+
+
+def _table(driver: str, name: str) -> str:
+    return get_backend(driver).table(name)
+
+
+def _placeholders(driver: str, count: int) -> str:
+    return get_backend(driver).placeholders(count)
+
+
+# SQL is generated once per backend, table and shape (column list, row or IN
+# list count) and reused for the life of the process. Shapes are bounded by
+# the chunk sizes, so the caches stay small.
+
+
+@lru_cache(maxsize=None)
+def _insert_sql(driver: str, table: str, columns: Tuple[str, ...], rows: int = 1) -> str:
+    """INSERT of `rows` rows in one VALUES list"""
+    row = f"({_placeholders(driver, len(columns))})"
+    return (
+        f"INSERT INTO {_table(driver, table)} ({', '.join(columns)}) "
+        f"VALUES {', '.join([row] * rows)}"
+    )
+
+
+@lru_cache(maxsize=None)
+def _delete_in_sql(driver: str, table: str, column: str, count: int) -> str:
+    return (
+        f"DELETE FROM {_table(driver, table)} "
+        f"WHERE {column} IN ({_placeholders(driver, count)})"
+    )
+
+
+@lru_cache(maxsize=None)
+def _select_in_sql(
+    driver: str, table: str, select: Tuple[str, ...], column: str, count: int
+) -> str:
+    return (
+        f"SELECT {', '.join(select)} FROM {_table(driver, table)} "
+        f"WHERE {column} IN ({_placeholders(driver, count)})"
+    )
+
+
+@lru_cache(maxsize=None)
+def _select_sql(
+    driver: str, table: str, select: Tuple[str, ...], order_by: str = ""
+) -> str:
+    """SELECT of every row of `table`"""
+    order = f" ORDER BY {order_by}" if order_by else ""
+    return f"SELECT {', '.join(select)} FROM {_table(driver, table)}{order}"
+
+
+@lru_cache(maxsize=None)
+def _update_sql(
+    driver: str, table: str, columns: Tuple[str, ...], where: Tuple[str, ...]
+) -> str:
+    """UPDATE of `columns` in the rows matching each of the `where` columns"""
+    marker = get_backend(driver).paramstyle
+    assignments = ", ".join(f"{c} = {marker}" for c in columns)
+    conditions = " AND ".join(f"{c} = {marker}" for c in where)
+    return f"UPDATE {_table(driver, table)} SET {assignments} WHERE {conditions}"
+
 
+def _update_by_id_sql(driver: str, table: str, columns: Tuple[str, ...]) -> str:
+    return _update_sql(driver, table, columns, ("id",))
 
-def _dataclass_to_dict(obj) -> Dict[str, Any]:
-    """Convert dataclass to dictionary, handling datetime and Decimal"""
-    data = asdict(obj)
-    for key, value in data.items():
-        if isinstance(value, datetime):
-            data[key] = value.strftime("%Y-%m-%d %H:%M:%S")
-        elif isinstance(value, Decimal):
-            data[key] = float(value)
-    return data
 
+@lru_cache(maxsize=None)
+def _upsert_orders_sql(driver: str, columns: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    Statements upserting ShipmentOrder headers, rewriting only changed rows
 
-def insert_order(connection: Connection, order) -> bool:
-    """Insert main order record"""
-    cursor = None
-    try:
-        cursor = connection.cursor()
-        order_dict = _dataclass_to_dict(order)
+    pymssql: create #ShipmentOrder_Upsert, MERGE from it and drop it (rows
+    are inserted into the temp table in between). sqlite3: a single
+    INSERT ... ON CONFLICT DO UPDATE, executed per row.
+    """
+    compared = [column for column in columns if column != "id"]
+    column_list = ", ".join(columns)
+
+    if driver == "sqlite3":
+        return (
+            f"""
+            INSERT INTO ShipmentOrder ({column_list}) VALUES ({_placeholders(driver, len(columns))})
+            ON CONFLICT(id) DO UPDATE SET
+                {", ".join(f"{c} = excluded.{c}" for c in compared)},
+                updated_at = CURRENT_TIMESTAMP
+            WHERE {" OR ".join(f"ShipmentOrder.{c} IS NOT excluded.{c}" for c in compared)}
+            """,
+        )
 
-        # Remove auto-generated timestamp fields if they're None
-        order_dict.pop("api_fetch_timestamp", None)
-        order_dict.pop("created_at", None)
-        order_dict.pop("updated_at", None)
+    return (
+        f"SELECT TOP 0 {column_list} INTO #ShipmentOrder_Upsert FROM dbo.ShipmentOrder",
+        f"""
+        MERGE dbo.ShipmentOrder WITH (HOLDLOCK) AS target
+        USING #ShipmentOrder_Upsert AS source
+            ON target.id = source.id
+        WHEN MATCHED AND EXISTS (
+            SELECT {", ".join(f"source.{c}" for c in compared)}
+            EXCEPT
+            SELECT {", ".join(f"target.{c}" for c in compared)}
+        ) THEN UPDATE SET
+            {", ".join(f"{c} = source.{c}" for c in compared)},
+            updated_at = GETDATE()
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT ({column_list})
+            VALUES ({", ".join(f"source.{c}" for c in columns)});
+        """,
+        "DROP TABLE #ShipmentOrder_Upsert",
+    )
+
+
+# Fixed queries per backend
+_QUERIES = {
+    "pymssql": {
+        "staging_chunk": """
+        SELECT TOP (%s) id, raw_json, raw_payload, raw_format FROM dbo.ShipmentOrder_Staging
+        WHERE id > %s ORDER BY id
+        """,
+        "last_fetched_date": "SELECT MAX(fetch_timestamp) FROM dbo.ShipmentOrder_Runs WHERE success = 1 AND partial = 0",
+    },
+    "sqlite3": {
+        "staging_chunk": """
+        SELECT id, raw_json, raw_payload, raw_format FROM ShipmentOrder_Staging
+        WHERE id > ? ORDER BY id LIMIT ?
+        """,
+        "last_fetched_date": "SELECT MAX(fetch_timestamp) FROM ShipmentOrder_Runs WHERE success = 1 AND partial = 0",
+    },
+}
+
+
+def _chunks(items: List, size: int) -> Iterator[List]:
+    """Split a list into consecutive slices of at most `size` items"""
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _unchanged_orders(cursor, hashes: Dict[Any, str]) -> set:
+    """IDs of orders whose stored content_hash matches the given hash"""
+    unchanged = set()
+    driver = _driver(cursor)
+    for chunk in _chunks(list(hashes.keys()), STAGING_CHUNK_SIZE):
+        cursor.execute(
+            _select_in_sql(driver, "ShipmentOrder", ("id", "content_hash"), "id", len(chunk)),
+            tuple(chunk),
+        )
+        for order_id, stored_hash in cursor.fetchall():
+            if stored_hash is not None and stored_hash == hashes.get(order_id):
+                unchanged.add(order_id)
+    return unchanged
 
-        columns = ", ".join(order_dict.keys())
 
-        placeholders = ", ".join(["%s"] * len(order_dict))  # pymssql
-        query = f"""INSERT INTO dbo.ShipmentOrder ({columns}) VALUES ({placeholders})"""  # pymssql
-        cursor.execute(
-            "DELETE FROM dbo.ShipmentOrder WHERE id = %s", (order.id,)
-        )  # pymssql
+# Orders written to staging: each order's dict and its JSON text
+StagedOrders = List[Tuple[Dict[str, Any], str]]
+
+
+def insert_staging_orders(
+    connection: Connection,
+    orders: List[Dict[str, Any]],
+    raw_orders: Optional[List[str]] = None,
+) -> int:
+    """
+    Write a page of raw API orders to the staging table, see stage_orders
+
+    Returns:
+        int: number of orders skipped because they were unchanged
+    """
+    return stage_orders(connection, orders, raw_orders)[1]
+
+
+def stage_orders(
+    connection: Connection,
+    orders: List[Dict[str, Any]],
+    raw_orders: Optional[List[str]] = None,
+) -> Tuple[StagedOrders, int]:
+    """
+    Write a page of raw API orders to the staging table, replacing older copies
+
+    Orders are deduplicated by ID (last copy wins), and orders whose content
+    hash matches the last loaded copy in ShipmentOrder are dropped. Older
+    staged copies are removed with one DELETE per chunk of IDs, and the page
+    is inserted as multi-row statements rather than one round trip per order.
+    `raw_orders`, the JSON text of each order as received, is staged as is
+    when given; otherwise orders are serialized.
+
+    Returns:
+        The orders staged, and the number of orders skipped because they
+        were unchanged
+    """
+    latest: Dict[Any, Tuple[Dict[str, Any], Optional[str]]] = {}
+    for index, order in enumerate(orders):
+        latest[order.get("ID")] = (order, raw_orders[index] if raw_orders else None)
+    if not latest:
+        return [], 0
+
+    cursor = connection.cursor()
+    try:
+        unchanged = _unchanged_orders(
+            cursor,
+            {order_id: content_hash(order) for order_id, (order, _) in latest.items()},
+        )
+    finally:
+        cursor.close()
+    for order_id in unchanged:
+        del latest[order_id]
+    if not latest:
+        return [], len(unchanged)
+
+    fetch_timestamp = backend_for(connection).bind_datetime(datetime.now())
+    order_ids = list(latest.keys())
+    staged = [
+        (order, raw_json if raw_json is not None else dumps(order))
+        for order, raw_json in latest.values()
+    ]
+    rows = [
+        (order_id, *encode_payload(raw_json), fetch_timestamp)
+        for order_id, (_, raw_json) in zip(order_ids, staged)
+    ]
 
-        # placeholders = ", ".join(["?"] * len(order_dict))  # sqlite3
-        # query = f"INSERT OR IGNORE INTO ShipmentOrder ({columns}) VALUES ({placeholders})"  # sqlite3
-        # cursor.execute("DELETE FROM ShipmentOrder WHERE id = ?", (order.id,))  # sqlite3
+    cursor = connection.cursor()
+    try:
+        _delete_where_in(cursor, "ShipmentOrder_Staging", "order_id", order_ids)
+        _insert_rows(cursor, "ShipmentOrder_Staging", STAGING_COLUMNS, rows)
 
-        cursor.execute(query, list(order_dict.values()))
         connection.commit()
-        return True
-    except Error as e:
-        logging.error(f"Error inserting order: {e}")
+    except Error:
         connection.rollback()
-        return False
+        raise
     finally:
-        if cursor:
-            cursor.close()
+        cursor.close()
 
+    return staged, len(unchanged)
 
-def insert_order_lines(connection: Connection, lines: List) -> bool:
-    """Insert order line items in batch"""
-    if not lines:
-        return True
 
-    cursor = None
+def fetch_staging_chunk(
+    connection: Connection, after_id: int, limit: int
+) -> List[Tuple[int, str]]:
+    """
+    Next `limit` staged orders with a staging id greater than `after_id`
+
+    Keyset pagination on the staging primary key, so each chunk is an index
+    seek and only one chunk of raw JSON is held in memory at a time.
+    Compressed payloads are returned decompressed.
+    """
+    driver = _driver(connection)
+    params = (after_id, limit) if driver == "sqlite3" else (limit, after_id)
+    cursor = connection.cursor()
     try:
-        cursor = connection.cursor()
+        cursor.execute(_QUERIES[driver]["staging_chunk"], params)
+        return [
+            (staging_id, decode_payload(raw_json, raw_payload, raw_format))
+            for staging_id, raw_json, raw_payload, raw_format in cursor.fetchall()
+        ]
+    finally:
+        cursor.close()
 
-        for line in lines:
-            line_dict = _dataclass_to_dict(line)
-            line_dict.pop("created_at", None)
-            line_dict.pop("updated_at", None)
 
-            columns = ", ".join(line_dict.keys())
-            placeholders = ", ".join(["%s"] * len(line_dict))  # pymssql
-            query = f"INSERT INTO dbo.ShipmentOrder_Line ({columns}) VALUES ({placeholders})"  # pymssql
-            # placeholders = ", ".join(["?"] * len(line_dict))  # sqlite3
-            # query = f"INSERT OR IGNORE INTO ShipmentOrder_Line ({columns}) VALUES ({placeholders})"  # sqlite3
+def _delete_where_in(cursor, table: str, column: str, values: List) -> None:
+    """Delete rows of `table` whose `column` is in `values`, one statement per chunk"""
+    driver = _driver(cursor)
+    for chunk in _chunks(values, STAGING_CHUNK_SIZE):
+        cursor.execute(_delete_in_sql(driver, table, column, len(chunk)), tuple(chunk))
 
-            cursor.execute(query, list(line_dict.values()))
 
-        connection.commit()
+def _insert_rows(cursor, table: str, columns: List[str], rows: List[tuple]) -> None:
+    """Insert rows into `table` using the backend's bulk insert strategy"""
+    if not rows:
+        return
+
+    backend = backend_for(cursor)
+    columns = tuple(columns)
+    backend.insert_rows(
+        cursor, lambda count: _insert_sql(backend.name, table, columns, count), rows
+    )
+
+
+def _transaction(
+    connection: Connection,
+    name: str,
+    write: Callable[[Any], Dict[str, int]],
+    metrics: Optional[RunMetrics] = None,
+) -> bool:
+    """
+    Run `write(cursor)` and commit, retrying the whole transaction on deadlock
+
+    `write` returns the rows written per table, counted into `metrics` once
+    committed. Other errors are logged and rolled back, and False returned;
+    a dropped connection is raised for the caller to reconnect (see
+    models.pool.ConnectionPool).
+    """
+    backend = backend_for(connection)
+    for attempt in range(DEADLOCK_RETRIES + 1):
+        cursor = None
+        try:
+            cursor = connection.cursor()
+            written = write(cursor)
+            connection.commit()
+            if metrics is not None:
+                metrics.add_rows(written)
+            return True
+        except Error as e:
+            if backend.is_disconnect(e):
+                raise
+            connection.rollback()
+            if not backend.is_deadlock(e) or attempt == DEADLOCK_RETRIES:
+                logging.error(f"Error in {name}: {e}")
+                return False
+            delay = random.uniform(0.05, 0.1) * 2**attempt
+            logging.warning(f"{name}: deadlocked ({e}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+        finally:
+            if cursor:
+                cursor.close()
+    return False
+
+
+def order_rows(parsed: Dict[str, Any]) -> OrderRows:
+    """Flatten one order returned from WarehouseOrderParser.parse_response() into row tuples"""
+    out: OrderRows = {}
+    for key, table, _, _, _ in PARSED_TABLES:
+        to_row = ROW_CONVERTERS[table]
+        items = parsed[key]
+        out[table] = [to_row(items)] if key == "order" else [to_row(item) for item in items]
+    return out
+
+
+def _latest_by_order(batch: List[OrderRows]) -> Dict[int, OrderRows]:
+    """Index a batch by order id; a later copy of the same order replaces an earlier one"""
+    latest: Dict[int, OrderRows] = {}
+    for rows in batch:
+        latest[rows["ShipmentOrder"][0][ORDER_ID_INDEX]] = rows
+    return latest
+
+
+def _table_rows(latest: Dict[int, OrderRows], table: str) -> List[tuple]:
+    """All rows for one normalized table across a batch"""
+    return [row for rows in latest.values() for row in rows[table]]
+
+
+def bulk_insert_rows(
+    connection: Connection,
+    batch: List[OrderRows],
+    metrics: Optional[RunMetrics] = None,
+) -> bool:
+    """
+    Insert a batch of orders in a single transaction
+
+    Rows are grouped per target table and loaded with multi-row inserts, so
+    the number of round trips scales with tables x chunks rather than
+    orders x tables. Existing copies of each order and its child rows are
+    deleted first, and the orders' staging rows are removed on success.
+
+    Args:
+        batch: List of OrderRows, one per order (see order_rows)
+        metrics: counts the rows written per table, if given
+
+    Returns:
+        bool: True if the batch was committed, False otherwise
+    """
+    latest = _latest_by_order(batch)
+    if not latest:
         return True
-    except Error as e:
-        logging.error(f"Error inserting order lines: {e}")
-        connection.rollback()
-        return False
-    finally:
-        if cursor:
-            cursor.close()
+    order_ids = list(latest.keys())
+
+    def write(cursor) -> Dict[str, int]:
+        # children first, so this does not rely on ON DELETE CASCADE
+        for _, table, _, id_column, _ in reversed(PARSED_TABLES):
+            _delete_where_in(cursor, table, id_column, order_ids)
+
+        written = {}
+        for _, table, _, _, _ in PARSED_TABLES:
+            rows = _table_rows(latest, table)
+            _insert_rows(cursor, table, TABLE_COLUMNS[table], rows)
+            written[table] = len(rows)
+
+        _delete_where_in(cursor, "ShipmentOrder_Staging", "order_id", order_ids)
+        return written
+
+    return _transaction(connection, "bulk_insert_rows", write, metrics)
+
+
+def _merge_orders(cursor, columns: List[str], rows: List[tuple]) -> int:
+    """
+    Upsert ShipmentOrder headers, leaving unchanged rows untouched
+
+    On SQL Server the batch is staged in a temp table and applied with MERGE;
+    on sqlite with INSERT ... ON CONFLICT DO UPDATE. Either way a matched row
+    is only rewritten when at least one column differs.
+
+    Returns the number of headers inserted or updated.
+    """
+    driver = _driver(cursor)
+    statements = _upsert_orders_sql(driver, tuple(columns))
+
+    if driver == "sqlite3":
+        (upsert,) = statements
+        cursor.executemany(upsert, rows)
+        return cursor.rowcount
+
+    create, merge, drop = statements
+    cursor.execute(create)
+    _insert_rows(cursor, "#ShipmentOrder_Upsert", columns, rows)
+    cursor.execute(merge)
+    merged = cursor.rowcount
+    cursor.execute(drop)
+    return merged
+
+
+def _comparable(value: Any) -> Any:
+    """Normalize a value read back from the database to the form we insert"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _diff_child_rows(
+    cursor,
+    table: str,
+    id_column: str,
+    columns: List[str],
+    rows: List[tuple],
+    order_ids: List[int],
+) -> int:
+    """
+    Apply the difference between the stored and incoming child rows of a batch
 
+    Rows are matched on CHILD_KEYS (all columns when not listed). Matched rows
+    are updated only if a value changed, unmatched stored rows are deleted and
+    unmatched incoming rows are inserted. Updates set only the columns outside
+    the key, by the stored row's id.
+
+    Returns the number of rows inserted or updated.
+    """
+    key_columns = CHILD_KEYS.get(table, columns)
+    key_index = [columns.index(c) for c in key_columns]
+    set_columns = tuple(c for c in columns if c not in key_columns)
+    set_index = [columns.index(c) for c in set_columns]
+
+    driver = _driver(cursor)
+    existing: Dict[tuple, List[Tuple[Any, tuple]]] = {}
+    select = ("id", *columns)
+    for chunk in _chunks(order_ids, STAGING_CHUNK_SIZE):
+        cursor.execute(
+            _select_in_sql(driver, table, select, id_column, len(chunk)),
+            tuple(chunk),
+        )
+        for stored in cursor.fetchall():
+            values = tuple(_comparable(v) for v in stored[1:])
+            key = tuple(values[i] for i in key_index)
+            existing.setdefault(key, []).append((stored[0], values))
+
+    inserts = []
+    updates = []
+    for row in rows:
+        values = tuple(_comparable(v) for v in row)
+        matches = existing.get(tuple(values[i] for i in key_index))
+        if not matches:
+            inserts.append(row)
+            continue
+        row_id, stored = matches.pop()
+        if stored != values:
+            updates.append(tuple(row[i] for i in set_index) + (row_id,))
+    deletes = [row_id for matches in existing.values() for row_id, _ in matches]
+
+    _delete_where_in(cursor, table, "id", deletes)
+    if updates:
+        cursor.executemany(_update_by_id_sql(driver, table, set_columns), updates)
+    _insert_rows(cursor, table, columns, inserts)
+    return len(inserts) + len(updates)
+
+
+def upsert_rows(
+    connection: Connection,
+    batch: List[OrderRows],
+    metrics: Optional[RunMetrics] = None,
+) -> bool:
+    """
+    Upsert a batch of orders in a single transaction
 
-def insert_addresses(connection: Connection, addresses: List) -> bool:
-    """Insert address records"""
-    if not addresses:
+    Unlike bulk_insert_rows nothing is deleted and re-inserted
+    wholesale: headers are merged and child rows are diffed against what is
+    stored, so unchanged rows (and their indexes) are never rewritten.
+
+    Args:
+        batch: List of OrderRows, one per order (see order_rows)
+        metrics: counts the rows written (inserted or changed) per table, if given
+
+    Returns:
+        bool: True if the batch was committed, False otherwise
+    """
+    latest = _latest_by_order(batch)
+    if not latest:
         return True
+    order_ids = list(latest.keys())
+
+    def write(cursor) -> Dict[str, int]:
+        written = {}
+        for key, table, _, id_column, _ in PARSED_TABLES:
+            columns = TABLE_COLUMNS[table]
+            rows = _table_rows(latest, table)
+            if key == "order":
+                written[table] = _merge_orders(cursor, columns, rows)
+            else:
+                written[table] = _diff_child_rows(
+                    cursor, table, id_column, columns, rows, order_ids
+                )
+
+        _delete_where_in(cursor, "ShipmentOrder_Staging", "order_id", order_ids)
+        return written
+
+    return _transaction(connection, "upsert_rows", write, metrics)
+
 
-    cursor = None
+RUN_COLUMNS = ("fetch_timestamp", "success", "partial", "orders_fetched", "orders_skipped")
+RUN_METRIC_COLUMNS = ("run_id", "metric", "value")
+
+
+def insert_run(connection: Connection, run: ShipmentOrderRun) -> None:
+    """Record a run in ShipmentOrder_Runs and its metrics in ShipmentOrder_RunMetrics"""
+    backend = backend_for(connection)
+    cursor = connection.cursor()
     try:
-        cursor = connection.cursor()
+        cursor.execute(
+            _insert_sql(backend.name, "ShipmentOrder_Runs", RUN_COLUMNS),
+            (
+                backend.bind_datetime(run.fetch_timestamp),
+                run.success,
+                run.partial,
+                run.orders_fetched,
+                run.orders_skipped,
+            ),
+        )
+        run_id = cursor.lastrowid
+        _insert_rows(
+            cursor,
+            "ShipmentOrder_RunMetrics",
+            RUN_METRIC_COLUMNS,
+            [(run_id, metric, value) for metric, value in run.metrics.rows()],
+        )
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def _read_datetime(value: Any) -> Optional[datetime]:
+    """A datetime column as read back; sqlite3 returns the bound ISO string"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def last_fetched_date(conn: Connection) -> Optional[datetime]:
+    """Checks for the most recent time that the script ran successfully and fetched every page. If has not ran successfully, returns None"""
+    cursor = conn.cursor()
+    cursor.execute(_QUERIES[_driver(conn)]["last_fetched_date"])
+    result = cursor.fetchone()
+    if result and result[0] is not None:
+        return _read_datetime(result[0])
+    else:
+        return None
+
 
-        for address in addresses:
-            address_dict = _dataclass_to_dict(address)
-            address_dict.pop("id")  # Auto-generated
-            address_dict.pop("created_at", None)
-            address_dict.pop("updated_at", None)
+SYNC_STATE_COLUMNS = ("warehouse_id", "last_modified_date")
 
-            columns = ", ".join(address_dict.keys())
-            placeholders = ", ".join(["%s"] * len(address_dict))  # pymssql
-            query = f"INSERT INTO dbo.ShipmentOrder_Address ({columns}) VALUES ({placeholders})"  # pymssql
-            # placeholders = ", ".join(["?"] * len(address_dict))  # sqlite3
-            # query = f"INSERT OR IGNORE INTO ShipmentOrder_Address ({columns}) VALUES ({placeholders})"  # sqlite3
 
-            cursor.execute(query, list(address_dict.values()))
+def load_sync_state(connection: Connection) -> Dict[int, datetime]:
+    """High-water mark (latest LastModifiedDate fetched) per warehouse"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            _select_sql(_driver(connection), "ShipmentOrder_SyncState", SYNC_STATE_COLUMNS)
+        )
+        return {warehouse: _read_datetime(mark) for warehouse, mark in cursor.fetchall()}
+    finally:
+        cursor.close()
 
+
+def save_sync_state(connection: Connection, marks: Dict[int, datetime]) -> None:
+    """Replace the high-water marks of the warehouses in `marks`"""
+    if not marks:
+        return
+    backend = backend_for(connection)
+    cursor = connection.cursor()
+    try:
+        _delete_where_in(cursor, "ShipmentOrder_SyncState", "warehouse_id", list(marks))
+        _insert_rows(
+            cursor,
+            "ShipmentOrder_SyncState",
+            SYNC_STATE_COLUMNS,
+            [(warehouse, backend.bind_datetime(mark)) for warehouse, mark in marks.items()],
+        )
         connection.commit()
-        return True
-    except Error as e:
-        logging.error(f"Error inserting addresses: {e}")
+    except Error:
         connection.rollback()
-        return False
+        raise
     finally:
-        if cursor:
-            cursor.close()
+        cursor.close()
 
 
-def clean_staging_table(connection: Connection, id: int) -> bool:
-    cursor = connection.cursor()
+PAGE_SIZE_COLUMNS = ("warehouse_id", "page_size")
+
 
+def load_page_sizes(connection: Connection) -> Dict[int, int]:
+    """PageSize tuned for each warehouse by earlier runs"""
+    cursor = connection.cursor()
     try:
         cursor.execute(
-            "DELETE FROM dbo.ShipmentOrder_Staging WHERE order_id = %s", (id,)
-        )  # pymssql
-        # cursor.execute(
-        #     "DELETE FROM ShipmentOrder_Staging WHERE order_id = ?", (id,)
-        # )  # sqlite3
+            _select_sql(_driver(connection), "ShipmentOrder_PageSize", PAGE_SIZE_COLUMNS)
+        )
+        return dict(cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def save_page_sizes(connection: Connection, sizes: Dict[int, int]) -> None:
+    """Replace the tuned PageSize of the warehouses in `sizes`"""
+    if not sizes:
+        return
+    cursor = connection.cursor()
+    try:
+        _delete_where_in(cursor, "ShipmentOrder_PageSize", "warehouse_id", list(sizes))
+        _insert_rows(cursor, "ShipmentOrder_PageSize", PAGE_SIZE_COLUMNS, list(sizes.items()))
         connection.commit()
-        return True
-    except Error as e:
-        logging.error(f"Error deleting entry: {e}")
+    except Error:
         connection.rollback()
-        return False
+        raise
     finally:
-        if cursor:
-            cursor.close()
+        cursor.close()
 
 
-def insert_lists(conn: Connection, data: List, table_name: str) -> bool:
-    if len(data) == 0:
-        return True
+CHECKPOINT_COLUMNS = tuple(f.name for f in fields(FetchCheckpoint))
+_CHECKPOINT_DATES = {"order_date_start", "order_date_end", "last_modified_start", "high_water_mark"}
 
-    cursor = conn.cursor()
 
+def load_checkpoints(connection: Connection) -> List[FetchCheckpoint]:
+    """Checkpoints of an unfinished fetch, by warehouse and shard"""
+    cursor = connection.cursor()
     try:
-        line_dict = _dataclass_to_dict(data[0])
-        columns = ", ".join(line_dict.keys())
-        placeholders = ", ".join(["%s"] * len(line_dict))  # pymssql
-        query = f"INSERT INTO dbo.ShipmentOrder_{table_name} ({columns}) VALUES ({placeholders})"  # pymssql
-        # placeholders = ", ".join(["?"] * len(line_dict))  # sqlite3
-        # query = f"INSERT OR IGNORE INTO ShipmentOrder_{table_name} ({columns}) VALUES ({placeholders})"  # sqlite3
-        for item in data:
-            line_dict = _dataclass_to_dict(item)
-            cursor.execute(query, list(line_dict.values()))
-        conn.commit()
-        return True
-    except Error as e:
-        logging.error(f"Error deleting entry: {e}")
-        conn.rollback()
-        return False
+        cursor.execute(
+            _select_sql(
+                _driver(connection),
+                "ShipmentOrder_FetchCheckpoint",
+                CHECKPOINT_COLUMNS,
+                "warehouse_id, shard",
+            )
+        )
+        checkpoints = []
+        for row in cursor.fetchall():
+            values = {
+                column: _read_datetime(value) if column in _CHECKPOINT_DATES else value
+                for column, value in zip(CHECKPOINT_COLUMNS, row)
+            }
+            values["completed"] = bool(values["completed"])
+            checkpoints.append(FetchCheckpoint(**values))
+        return checkpoints
     finally:
-        if cursor:
-            cursor.close()
+        cursor.close()
 
 
-def insert_parsed_data(connection: Connection, parsed_data: Dict[str, Any]) -> bool:
-    """
-    Insert all parsed data in correct order
+def _checkpoint_row(backend, checkpoint: FetchCheckpoint, columns: Tuple[str, ...]) -> tuple:
+    return tuple(
+        backend.bind_datetime(value) if isinstance(value, datetime) else value
+        for value in (getattr(checkpoint, column) for column in columns)
+    )
 
-    Args:
-        parsed_data: Dictionary returned from WarehouseOrderParser.parse_response()
 
-    Returns:
-        bool: True if all inserts successful, False otherwise
-    """
+def save_checkpoints(connection: Connection, checkpoints: List[FetchCheckpoint]) -> None:
+    """Replace every stored shard of these checkpoints' warehouses with `checkpoints`"""
+    if not checkpoints:
+        return
+    backend = backend_for(connection)
+    rows = [_checkpoint_row(backend, checkpoint, CHECKPOINT_COLUMNS) for checkpoint in checkpoints]
+    cursor = connection.cursor()
     try:
-        # Insert in order of dependencies
-        success = True
-
-        success &= insert_order(connection, parsed_data["order"])
-        success &= insert_order_lines(connection, parsed_data["lines"])
-        success &= insert_addresses(connection, parsed_data["addresses"])
-        success &= insert_lists(
-            connection, data=parsed_data["channels"], table_name="Channel"
-        )
-        success &= insert_lists(
-            connection, data=parsed_data["carriers"], table_name="Carrier"
-        )
-        success &= insert_lists(
-            connection, data=parsed_data["custom_statuses"], table_name="CustomStatus"
-        )
-        success &= insert_lists(
-            connection,
-            data=parsed_data["fba_order_statuses"],
-            table_name="WarehouseFBAOrderStatus",
-        )
-        success &= insert_lists(
-            connection,
-            data=parsed_data["warehouse_statuses"],
-            table_name="WarehouseOrderStatus",
+        _delete_where_in(
+            cursor,
+            "ShipmentOrder_FetchCheckpoint",
+            "warehouse_id",
+            sorted({checkpoint.warehouse_id for checkpoint in checkpoints}),
         )
+        _insert_rows(cursor, "ShipmentOrder_FetchCheckpoint", CHECKPOINT_COLUMNS, rows)
+        connection.commit()
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
 
-        if success:
-            clean_staging_table(connection, parsed_data["order"].id)
 
-        return success
+_CHECKPOINT_PROGRESS = ("page_size", "last_page", "completed", "high_water_mark")
 
-    except Exception as e:
-        logging.error(f"Error in insert_parsed_data: {e}")
-        return False
 
+def update_checkpoint(connection: Connection, checkpoint: FetchCheckpoint) -> None:
+    """Store a shard's progress (page size, last page, completion and high-water mark)"""
+    backend = backend_for(connection)
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            _update_sql(
+                backend.name,
+                "ShipmentOrder_FetchCheckpoint",
+                _CHECKPOINT_PROGRESS,
+                ("warehouse_id", "shard"),
+            ),
+            _checkpoint_row(backend, checkpoint, _CHECKPOINT_PROGRESS)
+            + (checkpoint.warehouse_id, checkpoint.shard),
+        )
+        connection.commit()
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
 
-def last_fetched_date(conn: Connection) -> Optional[datetime]:
-    """Checks for the most recent time that the script ran successfully. If has not ran successfully, returns None"""
-    select_query = "SELECT MAX(fetch_timestamp) FROM dbo.ShipmentOrder_Runs WHERE success = 1"  # pymssql
-    # select_query = "SELECT MAX(fetch_timestamp) FROM ShipmentOrder_Runs WHERE success = 1"  # sqlite3
-    cursor = conn.cursor()
-    cursor.execute(select_query)
-    result = cursor.fetchone()
-    if result and result[0] is not None:
-        if isinstance(result[0], datetime):
-            return result[0]
-        else:
-            return datetime.fromisoformat(result[0])
-    else:
-        return None
+
+def clear_checkpoints(connection: Connection) -> None:
+    """Forget a finished (or abandoned) fetch"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(backend_for(connection).truncate_sql("ShipmentOrder_FetchCheckpoint"))
+        connection.commit()
+    finally:
+        cursor.close()
@@ -3,13 +3,15 @@ Data models for Warehouse Order API response
 Normalized structure for SQL storage
 """
 
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
 from datetime import datetime
 from decimal import Decimal
 
+from .metrics import RunMetrics
 
-@dataclass
+
+@dataclass(slots=True)
 class ShipmentOrder:
     """Main order header table"""
 
@@ -194,11 +196,12 @@ class ShipmentOrder:
     record_count: Optional[int] = None
     # Processing metadata
     api_fetch_timestamp: Optional[datetime] = None
+    content_hash: Optional[str] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ShipmentOrderLine:
     """Order line items - DetailInfo array"""
 
@@ -253,7 +256,7 @@ class ShipmentOrderLine:
     updated_at: Optional[datetime] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ShipmentOrderAddress:
     """Shipping and billing addresses - based on ThirdPartyAccount structure"""
 
@@ -272,7 +275,7 @@ class ShipmentOrderAddress:
     updated_at: Optional[datetime] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ChannelId:
     """"""
 
@@ -280,7 +283,7 @@ class ChannelId:
     channel_id: int
 
 
-@dataclass
+@dataclass(slots=True)
 class WarehouseOrderStatusId:
     """"""
 
@@ -288,7 +291,7 @@ class WarehouseOrderStatusId:
     status_id: int
 
 
-@dataclass
+@dataclass(slots=True)
 class WarehouseFBAOrderStatusId:
     """"""
 
@@ -296,7 +299,7 @@ class WarehouseFBAOrderStatusId:
     status_id: int
 
 
-@dataclass
+@dataclass(slots=True)
 class CustomStatus:
     """"""
 
@@ -304,9 +307,82 @@ class CustomStatus:
     status_id: int
 
 
-@dataclass
+@dataclass(slots=True)
 class CarrierId:
     """"""
 
     order_id: int
     carrier_id: int
+
+
+@dataclass(slots=True)
+class ShipmentOrderRun:
+    """A single run of the script - ShipmentOrder_Runs"""
+
+    fetch_timestamp: datetime
+    success: bool = False
+    partial: bool = False  # some pages were not fetched; resumed by the next run
+    orders_fetched: int = 0
+    orders_skipped: int = 0  # unchanged since the last load, never staged
+    # latest LastModifiedDate fetched per warehouse - ShipmentOrder_SyncState
+    high_water_marks: Dict[int, datetime] = field(default_factory=dict)
+    # phase timings and counters - ShipmentOrder_RunMetrics
+    metrics: RunMetrics = field(default_factory=RunMetrics)
+
+
+@dataclass(slots=True)
+class FetchCheckpoint:
+    """Progress of one shard of a warehouse's fetch, kept until every warehouse is done - ShipmentOrder_FetchCheckpoint"""
+
+    warehouse_id: int
+    shard: int  # numbers the warehouse's sub-windows; 0 is the whole window
+    page_size: int  # orders per page, fixed while the shard is paged
+    # the query window, frozen when the fetch started or the shard was split off
+    order_date_start: datetime
+    order_date_end: datetime
+    last_modified_start: Optional[datetime] = None
+    last_page: int = 0  # pages 1..last_page are staged
+    completed: bool = False
+    high_water_mark: Optional[datetime] = None  # latest LastModifiedDate staged so far
+
+
+def _db_datetime(value: Any) -> Any:
+    return value.strftime("%Y-%m-%d %H:%M:%S") if isinstance(value, datetime) else value
+
+
+def _db_decimal(value: Any) -> Any:
+    return float(value) if isinstance(value, Decimal) else value
+
+
+_ROW_CONVERTERS: Dict[Tuple[type, Tuple[str, ...]], Callable[[Any], tuple]] = {}
+
+
+def row_converter(cls, columns: Sequence[str]) -> Callable[[Any], tuple]:
+    """
+    Compiled `record -> tuple of DB parameters` for the given columns of `cls`
+
+    Reads each attribute once and converts datetime and Decimal values in the
+    same pass, so no intermediate dict is built (unlike dataclasses.asdict,
+    which also deep-copies). Converters are cached per class and column list.
+    """
+    key = (cls, tuple(columns))
+    if key in _ROW_CONVERTERS:
+        return _ROW_CONVERTERS[key]
+
+    types = {f.name: f.type for f in fields(cls)}
+    values = []
+    for column in columns:
+        args = getattr(types[column], "__args__", (types[column],))
+        if datetime in args:
+            values.append(f"_db_datetime(record.{column})")
+        elif Decimal in args:
+            values.append(f"_db_decimal(record.{column})")
+        else:
+            values.append(f"record.{column}")
+
+    name = f"{cls.__name__}_to_row"
+    source = f"def {name}(record):\n    return ({', '.join(values)},)\n"
+    namespace: Dict[str, Any] = {"_db_datetime": _db_datetime, "_db_decimal": _db_decimal}
+    exec(compile(source, f"<{name}>", "exec"), namespace)
+    _ROW_CONVERTERS[key] = namespace[name]
+    return namespace[name]
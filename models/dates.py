@@ -0,0 +1,158 @@
+"""
+Fast parsing of the date strings sent by the Logiwa API
+
+The format is sniffed from the string's shape and parsed by hand, which
+avoids trying each strptime format in turn and paying for an exception on
+every miss. Results are memoized, since many orders share identical
+timestamps. Anything the fast paths do not recognize falls back to the
+original strptime formats, so the accepted inputs are unchanged.
+"""
+
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+# Distinct date strings remembered
+DATE_CACHE_SIZE = 8192
+
+# Formats accepted by WarehouseOrderParser.parse_datetime, in the order tried
+FORMATS = [
+    "%m.%d.%Y %I:%M:%S",  # 03.17.2022 12:32:59
+    "%m/%d/%Y %I:%M:%S %p",  # 5/17/2023 1:28:36 AM
+    "%Y-%m-%dT%H:%M:%S",  # ISO format
+    "%Y-%m-%d %H:%M:%S",  # Standard SQL format
+]
+
+# Calls to parse_datetime per format that parsed the value ("strptime" for the
+# fallback, "invalid" for unparseable values), cache hits included
+FORMAT_HITS: Counter = Counter()
+
+
+def _number(text: str, min_len: int, max_len: int) -> int:
+    if not (min_len <= len(text) <= max_len and text.isascii() and text.isdigit()):
+        raise ValueError(text)
+    return int(text)
+
+
+def _clock(text: str) -> Tuple[int, int, int]:
+    parts = text.split(":")
+    if len(parts) != 3:
+        raise ValueError(text)
+    return _number(parts[0], 1, 2), _number(parts[1], 1, 2), _number(parts[2], 1, 2)
+
+
+def _hour12(hour: int) -> int:
+    """%I without %p, as strptime reads it: 12 is midnight"""
+    if not 1 <= hour <= 12:
+        raise ValueError(hour)
+    return hour % 12
+
+
+def _parse_dotted(value: str) -> datetime:
+    """03.17.2022 12:32:59 (%m.%d.%Y %I:%M:%S)"""
+    date_part, time_part = value.split(" ")
+    month, day, year = date_part.split(".")
+    hour, minute, second = _clock(time_part)
+    return datetime(
+        _number(year, 4, 4),
+        _number(month, 1, 2),
+        _number(day, 1, 2),
+        _hour12(hour),
+        minute,
+        second,
+    )
+
+
+def _parse_slashed(value: str) -> datetime:
+    """5/17/2023 1:28:36 AM (%m/%d/%Y %I:%M:%S %p)"""
+    date_part, time_part, meridiem = value.split(" ")
+    month, day, year = date_part.split("/")
+    hour, minute, second = _clock(time_part)
+    meridiem = meridiem.upper()
+    if meridiem not in ("AM", "PM"):
+        raise ValueError(meridiem)
+    hour = _hour12(hour) + (12 if meridiem == "PM" else 0)
+    return datetime(
+        _number(year, 4, 4),
+        _number(month, 1, 2),
+        _number(day, 1, 2),
+        hour,
+        minute,
+        second,
+    )
+
+
+def _parse_fixed(value: str, separator: str) -> datetime:
+    """2022-03-17T12:32:59 / 2022-03-17 12:32:59, zero padded"""
+    if (
+        len(value) != 19
+        or value[4] != "-"
+        or value[7] != "-"
+        or value[10] != separator
+        or value[13] != ":"
+        or value[16] != ":"
+    ):
+        raise ValueError(value)
+    return datetime(
+        _number(value[0:4], 4, 4),
+        _number(value[5:7], 2, 2),
+        _number(value[8:10], 2, 2),
+        _number(value[11:13], 2, 2),
+        _number(value[14:16], 2, 2),
+        _number(value[17:19], 2, 2),
+    )
+
+
+_FAST_PARSERS: Dict[str, Callable[[str], datetime]] = {
+    "dotted": _parse_dotted,
+    "slashed": _parse_slashed,
+    "iso": lambda value: _parse_fixed(value, "T"),
+    "sql": lambda value: _parse_fixed(value, " "),
+}
+
+
+def _sniff(value: str) -> Optional[str]:
+    """Guess the format from the separators used"""
+    if "T" in value:
+        return "iso"
+    if "/" in value:
+        return "slashed"
+    if "." in value:
+        return "dotted"
+    if "-" in value:
+        return "sql"
+    return None
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse(value: str) -> Tuple[Optional[datetime], str]:
+    """Parse a date string, returning the result and the format that matched"""
+    shape = _sniff(value)
+    if shape is not None:
+        try:
+            return _FAST_PARSERS[shape](value), shape
+        except ValueError:
+            pass
+
+    for fmt in FORMATS:
+        try:
+            return datetime.strptime(value, fmt), "strptime"
+        except ValueError:
+            continue
+    return None, "invalid"
+
+
+def parse_datetime(date_str: Any) -> Optional[datetime]:
+    """Parse date strings from API - handles multiple formats"""
+    if not date_str or date_str == "null" or not isinstance(date_str, str):
+        return None
+    result, fmt = _parse(date_str)
+    FORMAT_HITS[fmt] += 1
+    return result
+
+
+def cache_info():
+    """Hit/miss statistics of the date string cache"""
+    return _parse.cache_info()
@@ -0,0 +1,146 @@
+"""
+Declarative API field mapping for WarehouseOrderParser
+
+Each dataclass field maps to an API key and a value kind. The spec is derived
+from the dataclass definitions (API keys follow the field name in PascalCase
+unless listed in API_KEYS) and compiled once, at import time, into a
+specialized converter function per record type.
+"""
+
+from dataclasses import fields
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from .datastructs import ShipmentOrder, ShipmentOrderLine
+
+
+class FieldSpec(NamedTuple):
+    api_key: str
+    column: str
+    kind: str  # one of "str", "int", "bool", "decimal", "datetime"
+
+
+# API keys that do not follow the PascalCase-with-"ID" naming convention
+API_KEYS: Dict[str, str] = {
+    # ShipmentOrder
+    "is_amazon_fba": "IsAmazonFBA",
+    "po_window_warehouse_id": "POWindowWarehouseID",
+    "master_edi_reference": "MasterEDIReference",
+    "warehouse_ord_return_reason_id": "WarehouseOrdReturnReasonId",
+    "is_auto_generate": "isAutoGenerate",
+    "is_use_same_lot_number": "isUseSameLotNumber",
+    "org_fba_order_id": "OrgFBAOrderId",
+    "warehouse_fba_order_status_code": "WarehouseFBAOrderStatusCode",
+    "warehouse_fba_order_status_desc": "WarehouseFBAOrderStatusDesc",
+    "selected_order": "selectedOrder",
+    "sscc": "SSCC",
+    "taxes_and_duties_billing_type": "TaxesandDutiesBillingType",
+    "tax_and_duties_payor_info": "TaxandDutiesPayorInfo",
+    # ShipmentOrderLine
+    "edi_reference": "EDIReference",
+    "sorted_cu_quantity": "SortedCUQuantity",
+    "packed_cu_quantity": "PackedCUQuantity",
+}
+
+_KINDS = {
+    str: "str",
+    int: "int",
+    bool: "bool",
+    Decimal: "decimal",
+    datetime: "datetime",
+}
+
+
+def api_key(column: str) -> str:
+    """API key for a column: priority_id -> PriorityID unless overridden"""
+    if column in API_KEYS:
+        return API_KEYS[column]
+    return "".join("ID" if part == "id" else part.capitalize() for part in column.split("_"))
+
+
+def _kind(annotation: Any) -> str:
+    """Value kind of an Optional[X] (or bare X) annotation"""
+    args = [a for a in getattr(annotation, "__args__", (annotation,)) if a is not type(None)]
+    return _KINDS[args[0]]
+
+
+def field_specs(cls, special: Dict[str, str]) -> List[FieldSpec]:
+    """Specs for every field of `cls` not filled in by a `special` expression"""
+    return [
+        FieldSpec(api_key(f.name), f.name, _kind(f.type))
+        for f in fields(cls)
+        if f.name not in special
+    ]
+
+
+# Expression templates per kind; `key` is the API key literal. The common
+# case (already the right type) is handled inline, everything else goes
+# through the same helpers WarehouseOrderParser uses.
+_EXPRESSIONS = {
+    "str": '(_v if type(_v := get({key})) is str and _v != "" and _v != "null" else _str(_v))',
+    "int": "(_v if type(_v := get({key})) is int else _int(_v))",
+    "bool": "(_v if type(_v := get({key})) is bool else _bool(_v))",
+    "decimal": "_decimal(get({key}))",
+    "datetime": "_datetime(get({key}))",
+}
+
+
+def compile_converter(
+    cls,
+    special: Dict[str, str],
+    helpers: Dict[str, Callable],
+    args: Optional[List[str]] = None,
+) -> Callable:
+    """
+    Build `convert(data, *args) -> cls` for one record type
+
+    `special` maps a column to a Python expression evaluated in the converter
+    (e.g. 'data["ID"]' or 'now'); `helpers` must provide _str, _int, _bool,
+    _decimal and _datetime plus any names the special expressions use.
+    """
+    specs = {spec.column: spec for spec in field_specs(cls, special)}
+    values = []
+    for f in fields(cls):
+        if f.name in special:
+            values.append(special[f.name])
+        else:
+            spec = specs[f.name]
+            values.append(_EXPRESSIONS[spec.kind].format(key=repr(spec.api_key)))
+
+    name = f"convert_{cls.__name__}"
+    params = ", ".join(["data"] + (args or []))
+    body = ",\n        ".join(values)
+    source = (
+        f"def {name}({params}):\n"
+        f"    get = data.get\n"
+        f"    now = _now()\n"
+        f"    return _cls(\n        {body},\n    )\n"
+    )
+
+    namespace: Dict[str, Any] = dict(helpers, _cls=cls, _now=datetime.now)
+    exec(compile(source, f"<{name}>", "exec"), namespace)
+    converter = namespace[name]
+    converter.source = source
+    return converter
+
+
+ORDER_SPECIAL = {
+    "id": 'data["ID"]',
+    "code": 'data["Code"]',
+    "api_fetch_timestamp": "now",
+    "content_hash": "_content_hash(data)",
+    "created_at": "now",
+    "updated_at": "now",
+}
+
+LINE_SPECIAL = {
+    "id": 'data["ID"]',
+    "code": 'data["Code"]',
+    "warehouse_order_id": "warehouse_order_id",
+    "created_at": "now",
+    "updated_at": "now",
+}
+
+ORDER_FIELDS = field_specs(ShipmentOrder, ORDER_SPECIAL)
+LINE_FIELDS = field_specs(ShipmentOrderLine, LINE_SPECIAL)
@@ -0,0 +1,114 @@
+"""
+JSON codec for API responses, staging payloads and content hashes
+
+orjson is used when installed and the standard library otherwise. Search
+responses can be split into their orders and, with the standard library,
+each order's exact JSON text, so staging stores what the API sent instead
+of serializing every order again.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON = Union[str, bytes]
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def loads(data: JSON) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj)
+
+
+def canonical_dumps(obj: Any) -> str:
+    """Sorted-key, compact JSON; identical for identical payloads"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode("utf-8")
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def _skip(text: str, index: int) -> int:
+    return _WHITESPACE.match(text, index).end()
+
+
+def _split_text(text: str) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Decode a response object, keeping the text of each element of its Data array
+
+    Walks the top-level object with the decoder's raw_decode, the way
+    json.loads does internally, so every value is parsed exactly once.
+    """
+    response: Dict[str, Any] = {}
+    raw_orders: List[str] = []
+
+    index = _skip(text, 0)
+    if text[index] != "{":
+        raise ValueError("expected a JSON object")
+    index = _skip(text, index + 1)
+    while text[index] != "}":
+        key, index = _decoder.raw_decode(text, index)
+        if not isinstance(key, str):
+            raise ValueError("expected a string key")
+        index = _skip(text, index)
+        if text[index] != ":":
+            raise ValueError("expected ':'")
+        index = _skip(text, index + 1)
+
+        if key == "Data" and text[index] == "[":
+            orders, raw_orders = [], []
+            index = _skip(text, index + 1)
+            while text[index] != "]":
+                order, end = _decoder.raw_decode(text, index)
+                orders.append(order)
+                raw_orders.append(text[index:end])
+                index = _skip(text, end)
+                if text[index] == ",":
+                    index = _skip(text, index + 1)
+                elif text[index] != "]":
+                    raise ValueError("expected ',' or ']'")
+            response[key] = orders
+            index += 1
+        else:
+            response[key], index = _decoder.raw_decode(text, index)
+
+        index = _skip(text, index)
+        if text[index] == ",":
+            index = _skip(text, index + 1)
+        elif text[index] != "}":
+            raise ValueError("expected ',' or '}'")
+
+    if _skip(text, index + 1) != len(text):
+        raise ValueError("extra data after the response")
+    return response, raw_orders
+
+
+def split_search_response(body: JSON) -> Tuple[Dict[str, Any], Optional[List[str]]]:
+    """
+    A WarehouseOrderSearch response and the JSON text of each order in Data
+
+    The texts are None when orjson is in use, as it decodes the whole body
+    faster than the orders could be sliced out; dumps() is cheap there too.
+    """
+    if orjson is not None:
+        return orjson.loads(body), None
+
+    text = body.decode("utf-8") if isinstance(body, bytes) else body
+    try:
+        return _split_text(text)
+    except (ValueError, IndexError):
+        # malformed or not an object: let json.loads report (or accept) it
+        return json.loads(text), None
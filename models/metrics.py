@@ -0,0 +1,205 @@
+"""
+Per-run instrumentation
+
+A RunMetrics travels with each ShipmentOrderRun and collects wall time per
+phase, API request latencies, retries and bytes, rows written per table, and
+the date formats seen and peak memory of the parse workers.
+It is saved with the run in ShipmentOrder_RunMetrics and can also be written
+as a JSON line (RUN_METRICS_JSONL) and as a Prometheus textfile
+(RUN_METRICS_PROM, e.g. for node_exporter's textfile collector).
+"""
+
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .datastructs import ShipmentOrderRun
+
+# Append one JSON object per run to this file
+RUN_METRICS_JSONL = os.getenv("RUN_METRICS_JSONL", "")
+# Overwrite this file with the last run's metrics in Prometheus text format
+RUN_METRICS_PROM = os.getenv("RUN_METRICS_PROM", "")
+
+# Request latency percentiles reported
+PERCENTILES = (50, 95, 99)
+
+# (name, label name, label value, value); the label is None for plain values
+Sample = Tuple[str, Optional[str], Optional[str], float]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of `values`, 0.0 when empty"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(q / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+class RunMetrics:
+    """
+    Timings and counters for one run
+
+    Phases are accumulated by name and may nest (e.g. "stage" time is also
+    part of "fetch"). Safe to update from the pipeline's threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.phase_seconds: Dict[str, float] = {}
+        self.request_seconds: List[float] = []
+        self.retries = 0
+        self.bytes_received = 0
+        self.rows_written: Counter = Counter()
+        self.date_formats: Counter = Counter()
+        self.worker_peak_rss_mb = 0.0
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        with self.lock:
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as (part of) phase `name`"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.monotonic() - started)
+
+    def add_rows(self, rows: Dict[str, int]) -> None:
+        """Count rows written per table by a committed batch"""
+        with self.lock:
+            self.rows_written.update(rows)
+
+    def add_date_formats(self, hits: Dict[str, int]) -> None:
+        """Count parsed date values per format (see models.dates.FORMAT_HITS)"""
+        with self.lock:
+            self.date_formats.update(hits)
+
+    def add_worker_rss(self, mb: float) -> None:
+        """Raise the parse workers' peak RSS to a worker's `mb`"""
+        with self.lock:
+            self.worker_peak_rss_mb = max(self.worker_peak_rss_mb, mb)
+
+    def record_api(
+        self, request_seconds: List[float], retries: int, bytes_received: int
+    ) -> None:
+        """Take the API client's request log and totals"""
+        with self.lock:
+            self.request_seconds = list(request_seconds)
+            self.retries = retries
+            self.bytes_received = bytes_received
+
+    def samples(self) -> List[Sample]:
+        with self.lock:
+            out: List[Sample] = [
+                ("phase_seconds", "phase", name, seconds)
+                for name, seconds in self.phase_seconds.items()
+            ]
+            out.append(("api_requests", None, None, len(self.request_seconds)))
+            out.extend(
+                ("api_request_seconds", "quantile", str(q / 100), percentile(self.request_seconds, q))
+                for q in PERCENTILES
+            )
+            out.append(("api_retries", None, None, self.retries))
+            out.append(("bytes_received", None, None, self.bytes_received))
+            out.extend(
+                ("rows_written", "table", table, count)
+                for table, count in sorted(self.rows_written.items())
+            )
+            out.extend(
+                ("date_format_hits", "format", fmt, count)
+                for fmt, count in sorted(self.date_formats.items())
+            )
+            out.append(("parse_worker_peak_rss_mb", None, None, self.worker_peak_rss_mb))
+            return out
+
+    def rows(self) -> List[Tuple[str, float]]:
+        """(metric, value) pairs as stored in ShipmentOrder_RunMetrics"""
+        return [
+            (name if label is None else f"{name}.{value}", sample)
+            for name, label, value, sample in self.samples()
+        ]
+
+    def summary(self) -> str:
+        phases = ", ".join(
+            f"{name} {seconds:.1f}s" for name, seconds in self.phase_seconds.items()
+        )
+        p50, p95 = (percentile(self.request_seconds, q) for q in (50, 95))
+        return (
+            f"{phases}; {len(self.request_seconds)} requests "
+            f"(p50 {p50 * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms), "
+            f"{sum(self.rows_written.values())} rows written"
+        )
+
+
+def _run_samples(run: "ShipmentOrderRun") -> List[Sample]:
+    return [
+        ("success", None, None, int(run.success)),
+        ("partial", None, None, int(run.partial)),
+        ("timestamp_seconds", None, None, run.fetch_timestamp.timestamp()),
+        ("orders_fetched", None, None, run.orders_fetched),
+        ("orders_skipped", None, None, run.orders_skipped),
+        *run.metrics.samples(),
+    ]
+
+
+def to_json(run: "ShipmentOrderRun") -> str:
+    """The run and its metrics as one JSON object"""
+    record: Dict[str, object] = {"fetch_timestamp": run.fetch_timestamp.isoformat()}
+    for name, label, value, sample in _run_samples(run):
+        if label is None:
+            record[name] = sample
+        else:
+            record.setdefault(name, {})[value] = sample
+    return json.dumps(record)
+
+
+def to_prometheus(run: "ShipmentOrderRun") -> str:
+    """The run's metrics in the Prometheus text exposition format"""
+    lines = []
+    typed = set()
+    for name, label, value, sample in _run_samples(run):
+        metric = f"logiwa_run_{name}"
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} gauge")
+        labels = f'{{{label}="{value}"}}' if label is not None else ""
+        lines.append(f"{metric}{labels} {sample}")
+    return "\n".join(lines) + "\n"
+
+
+def export(
+    run: "ShipmentOrderRun",
+    jsonl_path: str = RUN_METRICS_JSONL,
+    prom_path: str = RUN_METRICS_PROM,
+) -> None:
+    """Write the run's metrics to whichever of the configured files are set"""
+    try:
+        if jsonl_path:
+            with open(jsonl_path, "a") as out:
+                out.write(to_json(run) + "\n")
+        if prom_path:
+            # replace atomically so a scraper never reads a partial file
+            partial = f"{prom_path}.tmp"
+            with open(partial, "w") as out:
+                out.write(to_prometheus(run))
+            os.replace(partial, prom_path)
+    except OSError as e:
+        logging.error(f"Error writing run metrics: {e}")
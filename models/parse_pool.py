@@ -0,0 +1,106 @@
+"""
+Parse stage that spreads WarehouseOrderParser work across processes
+"""
+
+import logging
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from .database import OrderRows, order_rows
+from .dates import FORMAT_HITS
+from .metrics import RunMetrics, peak_rss_mb
+from .parsing import WarehouseOrderParser
+
+
+# Worker processes used to parse staged orders; 1 parses in-process
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+_parser = WarehouseOrderParser()
+
+# Either the parsed rows or the error message for one order
+ParseResult = Tuple[Optional[OrderRows], Optional[str]]
+
+# An order's JSON text, or the decoded order
+Payload = Union[str, bytes, Dict[str, Any]]
+
+
+class ParsedChunk(NamedTuple):
+    results: List[ParseResult]
+    format_hits: Counter  # date formats counted while parsing the chunk
+    peak_rss_mb: float  # of the process that parsed it
+
+
+def parse_chunk(raw_jsons: List[Payload]) -> ParsedChunk:
+    """Parse a chunk of raw orders; runs in a worker process"""
+    before = FORMAT_HITS.copy()
+    results: List[ParseResult] = []
+    for raw_json in raw_jsons:
+        try:
+            results.append((order_rows(_parser.parse_response(raw_json)), None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return ParsedChunk(results, FORMAT_HITS - before, peak_rss_mb())
+
+
+def split_results(results: List[ParseResult]) -> Tuple[List[OrderRows], bool]:
+    """Rows of the orders that parsed, and whether all did; failures are logged"""
+    batch = []
+    for rows, parse_error in results:
+        if parse_error is not None:
+            logging.error(f"Error parsing staged order: {parse_error}")
+        else:
+            batch.append(rows)
+    return batch, len(batch) == len(results)
+
+
+class ParseStage:
+    """
+    Parses batches of raw JSON, in a process pool when workers > 1
+
+    Date format counts and the workers' peak RSS are added to `metrics` if given.
+    """
+
+    def __init__(
+        self, workers: int = PARSE_WORKERS, metrics: Optional[RunMetrics] = None
+    ):
+        self.workers = max(1, workers)
+        self.metrics = metrics
+        self.executor: Optional[ProcessPoolExecutor] = None
+        if self.workers > 1:
+            # the parent runs threads (pipeline stages, the connection pool),
+            # which fork() would copy mid-flight along with their locks
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+
+    def __enter__(self) -> "ParseStage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.executor:
+            self.executor.shutdown()
+
+    def parse(self, raw_jsons: List[Payload]) -> List[ParseResult]:
+        """Parse a batch, preserving input order"""
+        pooled = self.executor is not None and len(raw_jsons) >= self.workers
+        if not pooled:
+            chunks = [parse_chunk(raw_jsons)]
+        else:
+            # one slice per worker keeps pickling overhead to a few messages
+            size = -(-len(raw_jsons) // self.workers)
+            slices = [raw_jsons[i : i + size] for i in range(0, len(raw_jsons), size)]
+            chunks = list(self.executor.map(parse_chunk, slices))
+
+        if self.metrics is not None:
+            for chunk in chunks:
+                self.metrics.add_date_formats(chunk.format_hits)
+                if pooled:
+                    self.metrics.add_worker_rss(chunk.peak_rss_mb)
+        return [result for chunk in chunks for result in chunk.results]
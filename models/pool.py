@@ -0,0 +1,177 @@
+"""
+Connection pool and a loader that spreads batches across it
+
+A batch of parsed orders is split by order id into one partition per pooled
+connection, and each partition is loaded in its own transaction on its own
+connection, so the normalized tables are written by several sessions at
+once. The same order always lands in the same partition. A connection that
+drops is replaced and the partition retried; loading is idempotent (orders
+are deleted and re-inserted, or upserted), so a retry after a drop during
+commit is safe.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, TypeVar
+
+from .backends import Connection, Error, backend_for, connect, get_backend
+from .database import ORDER_ID_INDEX, OrderRows
+
+# Database connections held open for loading; defaults to the backend's pool_size
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "0")) or get_backend().pool_size
+# Times work is retried on a new connection after the old one dropped
+RECONNECT_RETRIES = int(os.getenv("DB_RECONNECT_RETRIES", "5"))
+
+# Loads a batch of parsed orders on a connection, e.g. models.database.bulk_insert_rows
+Loader = Callable[[Connection, List[OrderRows]], bool]
+
+T = TypeVar("T")
+
+
+class ConnectionPool:
+    """
+    Up to `size` connections, each used by one thread at a time
+
+    Connections are opened on first use. run() hands work a connection and,
+    if the connection turns out to be dead, discards it and retries the work
+    on a fresh one with backoff.
+    """
+
+    def __init__(
+        self,
+        size: int = DB_POOL_SIZE,
+        connect: Callable[[], Connection] = connect,
+        reconnect_retries: int = RECONNECT_RETRIES,
+    ):
+        self.size = max(1, size)
+        self.connect = connect
+        self.reconnect_retries = reconnect_retries
+        self.idle: queue.LifoQueue = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(self.size)
+        self.reconnects = 0
+
+    def __enter__(self) -> "ConnectionPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def acquire(self) -> Connection:
+        """Take an idle connection, opening one if none is idle"""
+        self.slots.acquire()
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self.connect()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, conn: Connection, broken: bool = False) -> None:
+        """Return a connection, closing it instead if it is broken"""
+        if broken:
+            try:
+                conn.close()
+            except Error:
+                pass
+        else:
+            self.idle.put(conn)
+        self.slots.release()
+
+    def run(self, work: Callable[[Connection], T]) -> T:
+        """Call `work(conn)` with a pooled connection, reconnecting if it drops"""
+        for attempt in range(self.reconnect_retries + 1):
+            try:
+                conn = self.acquire()
+            except Error as e:
+                # the server may still be coming back
+                if attempt == self.reconnect_retries:
+                    raise
+                self._wait(attempt, f"could not connect ({e})")
+                continue
+
+            try:
+                result = work(conn)
+            except Error as e:
+                broken = backend_for(conn).is_disconnect(e)
+                self.release(conn, broken)
+                if not broken or attempt == self.reconnect_retries:
+                    raise
+                self.reconnects += 1
+                self._wait(attempt, f"connection dropped ({e})")
+                continue
+            except BaseException:
+                self.release(conn)
+                raise
+            self.release(conn)
+            return result
+        raise AssertionError("unreachable")
+
+    def _wait(self, attempt: int, reason: str) -> None:
+        delay = min(30.0, 2.0**attempt)
+        logging.warning(f"database {reason}, retrying in {delay:.0f}s")
+        time.sleep(delay)
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                conn.close()
+            except Error:
+                pass
+
+
+def partition(batch: List[OrderRows], count: int) -> List[List[OrderRows]]:
+    """Split a batch into up to `count` non-empty parts by order id"""
+    parts: List[List[OrderRows]] = [[] for _ in range(count)]
+    for rows in batch:
+        parts[rows["ShipmentOrder"][0][ORDER_ID_INDEX] % count].append(rows)
+    return [part for part in parts if part]
+
+
+class ParallelLoader:
+    """
+    Loads each batch as partitions in parallel, one per pooled connection
+
+    Called with a batch, returns True if every partition was committed;
+    partitions that fail leave their orders in staging for the next run.
+    """
+
+    def __init__(self, load: Loader, pool: ConnectionPool):
+        self.load = load
+        self.pool = pool
+        self.executor: Optional[ThreadPoolExecutor] = None
+        if pool.size > 1:
+            self.executor = ThreadPoolExecutor(pool.size, thread_name_prefix="loader")
+
+    def __enter__(self) -> "ParallelLoader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __call__(self, batch: List[OrderRows]) -> bool:
+        parts = partition(batch, self.pool.size)
+        if len(parts) <= 1 or self.executor is None:
+            return all(self._load(part) for part in parts)
+        return all(list(self.executor.map(self._load, parts)))
+
+    def _load(self, part: List[OrderRows]) -> bool:
+        try:
+            return self.pool.run(lambda conn: self.load(conn, part))
+        except Error as e:
+            logging.error(f"Error loading {len(part)} orders: {e}")
+            return False
+
+    def close(self) -> None:
+        if self.executor:
+            self.executor.shutdown()
@@ -0,0 +1,190 @@
+"""
+Pipelined run mode: fetch -> parse -> load, connected by bounded queues
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from models.backends import Connection
+from models.database import OrderRows, stage_orders
+from models.metrics import RunMetrics
+from models.parse_pool import PARSE_WORKERS, ParseStage, split_results
+
+# Batches held between two stages before the upstream stage blocks
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+
+# Loads a batch of parsed orders, e.g. a models.pool.ParallelLoader
+BatchLoader = Callable[[List[OrderRows]], bool]
+
+_DONE = object()
+
+
+class StageStats:
+    """Throughput of one pipeline stage and the depth of the queue it feeds"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0  # waiting on a full downstream queue
+        self.max_depth = 0
+        self.depth_total = 0
+        self.depth_samples = 0
+
+    def record(self, items: int, seconds: float) -> None:
+        self.items += items
+        self.busy_seconds += seconds
+
+    def put(self, out: queue.Queue, item: Any) -> None:
+        """Put onto the downstream queue, sampling its depth and any wait"""
+        depth = out.qsize()
+        self.max_depth = max(self.max_depth, depth)
+        self.depth_total += depth
+        self.depth_samples += 1
+
+        started = time.monotonic()
+        out.put(item)
+        self.blocked_seconds += time.monotonic() - started
+
+    def summary(self) -> str:
+        rate = self.items / self.busy_seconds if self.busy_seconds else 0.0
+        mean_depth = self.depth_total / self.depth_samples if self.depth_samples else 0.0
+        return (
+            f"{self.name}: {self.items} orders in {self.busy_seconds:.1f}s "
+            f"({rate:.0f}/s), blocked {self.blocked_seconds:.1f}s, "
+            f"queue depth max {self.max_depth} mean {mean_depth:.1f}"
+        )
+
+
+def _drain(source: queue.Queue) -> None:
+    """Discard everything up to the end marker, so upstream never blocks"""
+    while source.get() is not _DONE:
+        pass
+
+
+class Pipeline:
+    """
+    Runs a fetch with its pages flowing through parse and load threads
+
+    The fetch runs on the calling thread with `stage` as its staging hook
+    (see logiwa.api.StageOrders). The loader brings its own connections, as
+    DB-API connections are not shared between threads. Parse and load busy
+    time is added to `metrics` if given.
+    """
+
+    def __init__(
+        self,
+        load: BatchLoader,
+        batch_size: int,
+        workers: int = PARSE_WORKERS,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        metrics: Optional[RunMetrics] = None,
+    ):
+        self.load = load
+        self.batch_size = batch_size
+        self.workers = workers
+        self.metrics = metrics
+        self.parse_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.load_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.stats: Dict[str, StageStats] = {
+            name: StageStats(name) for name in ("fetch", "parse", "load")
+        }
+        self.success = True
+
+    def stage(
+        self,
+        conn: Connection,
+        orders: List[Dict[str, Any]],
+        raw_orders: Optional[List[str]] = None,
+    ) -> int:
+        """
+        Staging hook for the fetch: stage the page, then pass it downstream
+
+        Parsing in-process takes the decoded orders as they are; worker
+        processes get the JSON text, which pickles faster than dicts.
+        """
+        staged, skipped = stage_orders(conn, orders, raw_orders)
+        self.stats["fetch"].items += len(orders)
+        if staged:
+            in_process = self.workers <= 1
+            payloads = [order if in_process else raw for order, raw in staged]
+            self.stats["fetch"].put(self.parse_queue, payloads)
+        return skipped
+
+    def run(self, fetch: Callable[[Callable], bool]) -> bool:
+        """
+        Call `fetch(stage)` while the parse and load threads consume its pages
+
+        Returns the fetch's result; `success` is False afterwards if any
+        order could not be parsed or loaded (those stay in staging).
+        """
+        threads = [
+            threading.Thread(target=self._parse_worker, name="pipeline-parse"),
+            threading.Thread(target=self._load_worker, name="pipeline-load"),
+        ]
+        for thread in threads:
+            thread.start()
+
+        started = time.monotonic()
+        try:
+            fetched = fetch(self.stage)
+        finally:
+            self.stats["fetch"].busy_seconds = time.monotonic() - started
+            self.parse_queue.put(_DONE)
+            for thread in threads:
+                thread.join()
+
+        for stats in self.stats.values():
+            logging.info(f"pipeline {stats.summary()}")
+        if self.metrics is not None:
+            for name in ("parse", "load"):
+                self.metrics.add_phase(name, self.stats[name].busy_seconds)
+        return fetched
+
+    def _parse_worker(self) -> None:
+        stats = self.stats["parse"]
+        payloads: Any = None
+        try:
+            with ParseStage(self.workers, self.metrics) as parser:
+                while (payloads := self.parse_queue.get()) is not _DONE:
+                    started = time.monotonic()
+                    batch, all_parsed = split_results(parser.parse(payloads))
+                    self.success &= all_parsed
+                    stats.record(len(payloads), time.monotonic() - started)
+                    if batch:
+                        stats.put(self.load_queue, batch)
+        except Exception as e:
+            logging.error(f"pipeline parse stage: {e}")
+            self.success = False
+            if payloads is not _DONE:
+                _drain(self.parse_queue)
+        finally:
+            self.load_queue.put(_DONE)
+
+    def _load_worker(self) -> None:
+        stats = self.stats["load"]
+        batch: Any = None
+        pending: List[OrderRows] = []
+
+        def flush() -> None:
+            started = time.monotonic()
+            self.success &= self.load(pending)
+            stats.record(len(pending), time.monotonic() - started)
+            pending.clear()
+
+        try:
+            while (batch := self.load_queue.get()) is not _DONE:
+                pending.extend(batch)
+                if len(pending) >= self.batch_size:
+                    flush()
+            if pending:
+                flush()
+        except Exception as e:
+            logging.error(f"pipeline load stage: {e}")
+            self.success = False
+            if batch is not _DONE:
+                _drain(self.load_queue)
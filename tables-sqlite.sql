@@ -263,6 +263,7 @@ CREATE TABLE ShipmentOrder (
 
     -- Processing Metadata
     api_fetch_timestamp TEXT,
+    content_hash TEXT, -- SHA-256 of the canonicalized API payload
     created_at TEXT DEFAULT CURRENT_TIMESTAMP,
     updated_at TEXT DEFAULT CURRENT_TIMESTAMP
 );
@@ -443,7 +444,47 @@ CREATE TABLE ShipmentOrder_Carrier (
 CREATE TABLE ShipmentOrder_Runs (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     fetch_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    success INTEGER
+    success INTEGER,
+    partial INTEGER NOT NULL DEFAULT 0, -- fetch stopped short; not a high-water mark
+    orders_fetched INTEGER,
+    orders_skipped INTEGER -- unchanged orders dropped before staging
+);
+
+CREATE TABLE ShipmentOrder_RunMetrics (
+    run_id INTEGER NOT NULL REFERENCES ShipmentOrder_Runs(id),
+    metric TEXT NOT NULL, -- e.g. phase_seconds.fetch, rows_written.ShipmentOrder_Line
+    value REAL NOT NULL,
+    PRIMARY KEY (run_id, metric)
+);
+
+
+-- ============================================================================
+-- SYNC STATE TABLE
+-- ============================================================================
+CREATE TABLE ShipmentOrder_SyncState (
+    warehouse_id INTEGER PRIMARY KEY,
+    last_modified_date TIMESTAMP NOT NULL, -- latest LastModifiedDate fetched
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE ShipmentOrder_FetchCheckpoint (
+    warehouse_id INTEGER NOT NULL,
+    shard INTEGER NOT NULL, -- sub-window of the warehouse's OrderDate range
+    order_date_start TIMESTAMP NOT NULL, -- query window frozen when the fetch started
+    order_date_end TIMESTAMP NOT NULL,
+    last_modified_start TIMESTAMP,
+    page_size INTEGER NOT NULL, -- orders per page, fixed while the shard is paged
+    last_page INTEGER NOT NULL DEFAULT 0, -- pages 1..last_page are staged
+    completed INTEGER NOT NULL DEFAULT 0,
+    high_water_mark TIMESTAMP, -- latest LastModifiedDate staged so far
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (warehouse_id, shard)
+);
+
+CREATE TABLE ShipmentOrder_PageSize (
+    warehouse_id INTEGER PRIMARY KEY,
+    page_size INTEGER NOT NULL, -- PageSize tuned for the warehouse, the next run's starting point
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 
@@ -453,7 +494,9 @@ CREATE TABLE ShipmentOrder_Runs (
 CREATE TABLE ShipmentOrder_Staging (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     order_id INTEGER NOT NULL,
-    raw_json TEXT NOT NULL,
+    raw_json TEXT, -- uncompressed payload (raw_format 'json')
+    raw_payload BLOB, -- compressed payload ('zlib' or 'zstd')
+    raw_format TEXT NOT NULL DEFAULT 'json',
     fetch_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
 
     FOREIGN KEY (order_id) REFERENCES ShipmentOrder(id) ON DELETE CASCADE
@@ -263,6 +263,7 @@ CREATE TABLE dbo.ShipmentOrder (
     
     -- Processing Metadata
     api_fetch_timestamp DATETIME2,
+    content_hash CHAR(64), -- SHA-256 of the canonicalized API payload
     created_at DATETIME2 DEFAULT GETDATE(),
     updated_at DATETIME2 DEFAULT GETDATE()
 );
@@ -455,7 +456,46 @@ CREATE TABLE dbo.ShipmentOrder_Carrier (
 CREATE TABLE dbo.ShipmentOrder_Runs (
     id INT IDENTITY(1,1) PRIMARY KEY,
     fetch_timestamp DATETIME2 DEFAULT GETDATE(),
-    success BIT
+    success BIT,
+    partial BIT NOT NULL DEFAULT 0, -- fetch stopped short; not a high-water mark
+    orders_fetched INT,
+    orders_skipped INT -- unchanged orders dropped before staging
+);
+
+CREATE TABLE dbo.ShipmentOrder_RunMetrics (
+    run_id INT NOT NULL REFERENCES dbo.ShipmentOrder_Runs(id),
+    metric NVARCHAR(200) NOT NULL, -- e.g. phase_seconds.fetch, rows_written.ShipmentOrder_Line
+    value FLOAT NOT NULL,
+    PRIMARY KEY (run_id, metric)
+);
+
+-- ============================================================================
+-- SYNC STATE TABLE
+-- ============================================================================
+CREATE TABLE dbo.ShipmentOrder_SyncState (
+    warehouse_id INT PRIMARY KEY,
+    last_modified_date DATETIME2 NOT NULL, -- latest LastModifiedDate fetched
+    updated_at DATETIME2 DEFAULT GETDATE()
+);
+
+CREATE TABLE dbo.ShipmentOrder_FetchCheckpoint (
+    warehouse_id INT NOT NULL,
+    shard INT NOT NULL, -- sub-window of the warehouse's OrderDate range
+    order_date_start DATETIME2 NOT NULL, -- query window frozen when the fetch started
+    order_date_end DATETIME2 NOT NULL,
+    last_modified_start DATETIME2,
+    page_size INT NOT NULL, -- orders per page, fixed while the shard is paged
+    last_page INT NOT NULL DEFAULT 0, -- pages 1..last_page are staged
+    completed BIT NOT NULL DEFAULT 0,
+    high_water_mark DATETIME2, -- latest LastModifiedDate staged so far
+    updated_at DATETIME2 DEFAULT GETDATE(),
+    PRIMARY KEY (warehouse_id, shard)
+);
+
+CREATE TABLE dbo.ShipmentOrder_PageSize (
+    warehouse_id INT PRIMARY KEY,
+    page_size INT NOT NULL, -- PageSize tuned for the warehouse, the next run's starting point
+    updated_at DATETIME2 DEFAULT GETDATE()
 );
 
 -- ============================================================================
@@ -464,7 +504,9 @@ CREATE TABLE dbo.ShipmentOrder_Runs (
 CREATE TABLE dbo.ShipmentOrder_Staging (
     id INT IDENTITY(1,1) PRIMARY KEY,
     order_id INT NOT NULL,
-    raw_json NVARCHAR(MAX) NOT NULL,
+    raw_json NVARCHAR(MAX), -- uncompressed payload (raw_format 'json')
+    raw_payload VARBINARY(MAX), -- compressed payload ('zlib' or 'zstd')
+    raw_format VARCHAR(8) NOT NULL DEFAULT 'json',
     fetch_timestamp DATETIME2 DEFAULT GETDATE()
 );
 